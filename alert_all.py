@@ -8,39 +8,32 @@ chat_ids = [
 ]
 
 def alert(indicator_name):
-    # Fetch cached data for the given indicator
-    bull_raging_cache = db.fetch_cached_data_from_supabase(indicator_name)
-
-    # Filter out data with 'analysis' column's last JSON key older than 5 days
+    # Filter out data with latest signal older than 5 days
     five_days_ago = datetime.now() - timedelta(days=6)
 
     results_output = "__ *ticker | entry date | close price | volume* __\n"
 
-    # Filter and format the data
-    filtered_tickers = []
-    for ticker in bull_raging_cache:
-        last_key = next(reversed(ticker["analysis"]), None)
-        if last_key:
-            last_key_date = datetime.strptime(last_key, '%Y-%m-%d')
-            if last_key_date > five_days_ago:
-                filtered_tickers.append(ticker)
-                ticker_symbol = ticker.get('ticker', '?')
-                entry_date = last_key if last_key else '?'
-                entry_close_price = ticker['analysis'][last_key].get('close', '?')
-                volume = ticker['analysis'][last_key].get('volume', '?')
-
-                # Format entry close price and volume
-                if entry_close_price != '?':
-                    entry_close_price = round(float(entry_close_price), 2)
-
-                if volume != '?':
-                    volume = round(float(volume))
-
-                if entry_close_price == '?' or volume == '?' or entry_close_price < 20 or volume < 1000000:
-                    continue
-
-                # Add row to the table
-                results_output += f"✅ *{ticker_symbol}* | {entry_date} | {entry_close_price} | {volume}\n"
+    # Only the recent, liquid signals are read, using the latest_signal_* columns kept up to date
+    # by calculate_and_save_indicator_results.py instead of parsing every ticker's analysis
+    filtered_tickers = list(db.iter_table_rows(
+        indicator_name,
+        columns="ticker, latest_signal_date, latest_close, latest_volume",
+        filters=[
+            ("latest_signal_date", "gt", five_days_ago.strftime('%Y-%m-%d')),
+            ("latest_close", "gte", 20),
+            ("latest_volume", "gte", 1000000),
+        ],
+    ))
+
+    # Format the data
+    for ticker in filtered_tickers:
+        ticker_symbol = ticker.get('ticker', '?')
+        entry_date = ticker['latest_signal_date']
+        entry_close_price = round(float(ticker['latest_close']), 2)
+        volume = round(float(ticker['latest_volume']))
+
+        # Add row to the table
+        results_output += f"✅ *{ticker_symbol}* | {entry_date} | {entry_close_price} | {volume}\n"
 
     # Check if there are results
     if not filtered_tickers:
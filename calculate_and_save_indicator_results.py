@@ -1,105 +1,432 @@
 import utils.ticker_getter as tg
 import utils.indicator_evaluator as ie
 import utils.supabase as db
-import pandas as pd
+import utils.price_store as ps
+import utils.pipeline as pipeline
+import utils.metrics as metrics
+import utils.profiling as profiling
+from utils.checkpoint import Checkpoint, checkpoint_path, load_completed
 import numpy as np
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
-def calculate_and_save_indicator_results():
-    stock_list = tg.get_all_tickers()
+# trading days after a signal for which the price change is stored, as change{k}TD
+FORWARD_RETURN_HORIZONS = (1, 5, 20)
+
+# indicator -> (function returning signal dates, supabase table)
+INDICATORS = {
+    'bull_appear': (ie.get_apex_bull_appear_dates, 'apex_bull_appear'),
+    'bull_raging': (ie.get_apex_bull_raging_dates, 'apex_bull_raging'),
+    'bear_appear': (ie.get_apex_bear_appear_dates, 'apex_bear_appear'),
+    'bear_raging': (ie.get_apex_bear_raging_dates, 'apex_bear_raging'),
+}
+
+
+# The run is a pipeline of three stages joined by bounded queues: a fetch thread downloading prices
+# (fetch_workers chunks at a time, at most fetch_queue_size frames ahead), the evaluation in `workers`
+# processes, and a write thread hashing, batching and upserting results (at most write_queue_size waiting).
+def calculate_and_save_indicator_results(
+    workers=None, upsert_batch_size=200, run_date=None, time_budget=None, shard_index=0, shard_count=1,
+    fetch_workers=4, fetch_queue_size=None, write_queue_size=100, horizons=FORWARD_RETURN_HORIZONS,
+    dry_run=False, metrics_file=None, profile_indicators=None, profile_top=profiling.PROFILE_TOP
+):
+    workers = workers or os.cpu_count() or 1
+    fetch_queue_size = fetch_queue_size or workers * 2
+    start_time = time.monotonic()
+    shard = get_shard_name(shard_index, shard_count)
+    # a dry run keeps its own checkpoint, so it never makes a real run skip tickers
+    if dry_run:
+        shard = f"{shard or 'all'}.dry-run"
+    checkpoint = Checkpoint(run_date, shard)
+    checkpoint.prune()
+    print(f"Resuming run {checkpoint.run_date}: {len(checkpoint.completed)} ticker indicators already done")
+    stock_list = tg.get_ticker_shard(tg.get_all_tickers(), shard_index, shard_count)
     # stock_list = ["REXR-PC"]
+    if shard:
+        print(f"Screening {shard}: {len(stock_list)} tickers")
 
-    apex_bull_appear_cache = db.fetch_cached_data_from_supabase('apex_bull_appear')
-    apex_bull_raging_cache = db.fetch_cached_data_from_supabase('apex_bull_raging')
-    apex_bear_appear_cache = db.fetch_cached_data_from_supabase('apex_bear_appear')
-    apex_bear_raging_cache = db.fetch_cached_data_from_supabase('apex_bear_raging')
+    # a dry run neither reads from nor writes to the database
+    def fetch_cache(table_name):
+        if dry_run:
+            return []
+        return db.fetch_cached_data_from_supabase(table_name, columns='ticker, analysis_hash')
 
-    def filter_tickers(cache, description):
+    apex_bull_appear_cache = fetch_cache('apex_bull_appear')
+    apex_bull_raging_cache = fetch_cache('apex_bull_raging')
+    apex_bear_appear_cache = fetch_cache('apex_bear_appear')
+    apex_bear_raging_cache = fetch_cache('apex_bear_raging')
+
+    # tickers already completed for this indicator by an earlier, interrupted run of the same date
+    def filter_tickers(indicator, description):
         filtered_tickers = [
-            # ticker['ticker'] for ticker in cache
-            # if ticker['created_at'] > '05:00:00'
+            ticker for ticker in stock_list
+            if checkpoint.is_done(ticker, indicator)
         ]
         print(f"Tickers no need to screen {description}: {len(filtered_tickers)}")
-        return list(set(stock_list) - set(filtered_tickers))
+        return set(stock_list) - set(filtered_tickers)
 
     tickers_to_screen = {
-        'bull_appear': filter_tickers(apex_bull_appear_cache, 'bull appear'),
-        'bull_raging': filter_tickers(apex_bull_raging_cache, 'bull raging'),
-        'bear_appear': filter_tickers(apex_bear_appear_cache, 'bear appear'),
-        'bear_raging': filter_tickers(apex_bear_raging_cache, 'bear raging')
+        'bull_appear': filter_tickers('bull_appear', 'bull appear'),
+        'bull_raging': filter_tickers('bull_raging', 'bull raging'),
+        'bear_appear': filter_tickers('bear_appear', 'bear appear'),
+        'bear_raging': filter_tickers('bear_raging', 'bear raging')
     }
+    indicators_by_table = {table_name: indicator for indicator, (_, table_name) in INDICATORS.items()}
 
     for key, tickers in tickers_to_screen.items():
         print(f"Tickers to screen for {key.replace('_', ' ')}: {len(tickers)}")
 
-    total_tickers_to_screen = len(set(sum(tickers_to_screen.values(), [])))
+    # hash of the analysis currently stored for each (table, ticker), unchanged analyses are not rewritten
+    stored_hashes = {
+        table_name: {row['ticker']: row.get('analysis_hash') for row in cache}
+        for table_name, cache in [
+            ('apex_bull_appear', apex_bull_appear_cache),
+            ('apex_bull_raging', apex_bull_raging_cache),
+            ('apex_bear_appear', apex_bear_appear_cache),
+            ('apex_bear_raging', apex_bear_raging_cache),
+        ]
+    }
+
+    all_tickers_to_screen = sorted(set().union(*tickers_to_screen.values()))
+    total_tickers_to_screen = len(all_tickers_to_screen)
     tickers_screened = {key: 0 for key in tickers_to_screen}
     tickers_screened_total = 0
 
-    def process_ticker(ticker, indicator, get_dates_func, table_name):
-        dates = get_dates_func(ticker_data)
-        analysis_result = get_analysis_results(dates, ticker_data)
-        analysis_result = convert_to_serializable(analysis_result)
-        if analysis_result:
-            try:
-                db.upsert_data_to_supabase(table_name, {'ticker': ticker, 'analysis': analysis_result, 'created_at': 'now()'})
-                print(f"Upserted {indicator} analysis for {ticker}")
-            except Exception as e:
-                print(f"❌ Failed to upsert {indicator} analysis for {ticker}: {e}")
-            print(f"Upserted {indicator} analysis for {ticker}")
-        else:
-            print(f"No {indicator} analysis to upsert for {ticker}")
-        tickers_screened[indicator] += 1
-
-    for ticker in set(sum(tickers_to_screen.values(), [])):
-        ticker_data = tg.fetch_stock_data(ticker)
-
-        if ticker in tickers_to_screen['bull_appear']:
-            process_ticker(ticker, 'bull_appear', ie.get_apex_bull_appear_dates, 'apex_bull_appear')
-
-        if ticker in tickers_to_screen['bull_raging']:
-            process_ticker(ticker, 'bull_raging', ie.get_apex_bull_raging_dates, 'apex_bull_raging')
-
-        if ticker in tickers_to_screen['bear_appear']:
-            process_ticker(ticker, 'bear_appear', ie.get_apex_bear_appear_dates, 'apex_bear_appear')
-        
-        if ticker in tickers_to_screen['bear_raging']:
-            process_ticker(ticker, 'bear_raging', ie.get_apex_bear_raging_dates, 'apex_bear_raging')
+    # write stage, the only place touching the writer, the checkpoint and the metrics log
+    def save_results(item):
+        nonlocal tickers_screened_total
+        ticker, results, stages = item
+        if results is None:
+            metrics_log.count("empty_data")
+            # nothing more will come of a ticker without prices today (delisted, unknown to Yahoo), so it is
+            # done as far as the merge and a resumed run are concerned; failed indicators stay unmarked
+            for indicator, tickers in tickers_to_screen.items():
+                if ticker in tickers:
+                    checkpoint.mark(ticker, indicator, status='empty_data')
+            results = {}
+
+        statuses = {}
+        for indicator, analysis_result in results.items():
+            table_name = INDICATORS[indicator][1]
+            if analysis_result:
+                serialisation_start = time.perf_counter()
+                result_hash = get_analysis_hash(analysis_result)
+                stages['serialisation'] = stages.get('serialisation', 0.0) + time.perf_counter() - serialisation_start
+                if stored_hashes[table_name].get(ticker) == result_hash:
+                    writer.skip(table_name)
+                    checkpoint.mark(ticker, indicator)
+                    statuses[indicator] = 'unchanged'
+                    print(f"{indicator} analysis for {ticker} is unchanged")
+                else:
+                    statuses[indicator] = 'written'
+                    writer.add(table_name, {
+                        'ticker': ticker,
+                        'analysis': analysis_result,
+                        'analysis_hash': result_hash,
+                        **latest_signal_columns(analysis_result),
+                        'created_at': 'now()',
+                    })
+                    print(f"Queued {indicator} analysis for {ticker}")
+            elif analysis_result is not None:
+                checkpoint.mark(ticker, indicator)
+                statuses[indicator] = 'no_signals'
+                print(f"No {indicator} analysis to upsert for {ticker}")
+            else:
+                statuses[indicator] = 'failed'
+            tickers_screened[indicator] += 1
 
+        metrics_log.record_ticker(ticker, stages, statuses)
         tickers_screened_total += 1
         print(f"Progress: {tickers_screened_total}/{total_tickers_to_screen} tickers screened")
         for key, count in tickers_screened.items():
             print(f"Progress for {key.replace('_', ' ')}: {count}/{len(tickers_to_screen[key])} tickers screened")
 
-def get_analysis_results(dates, data):
+    # rows only count as done once their batch is in the database
+    def mark_written(table_name, rows):
+        for row in rows:
+            checkpoint.mark(row['ticker'], indicators_by_table[table_name])
+
+    # fetch stage, runs ahead of the evaluation in its own thread
+    def screenable_tickers():
+        batch = tg.fetch_stock_data_batch(all_tickers_to_screen, max_workers=fetch_workers)
+        while True:
+            # time spent waiting for the next ticker's prices, downloads of later chunks overlap with it
+            fetch_start = time.perf_counter()
+            ticker, ticker_data = next(batch, (None, None))
+            if ticker is None:
+                return
+            stages = {'fetch': time.perf_counter() - fetch_start}
+            # stop taking new tickers so this window ends cleanly, the next run resumes from the checkpoint
+            if time_budget and time.monotonic() - start_time > time_budget * 60:
+                print(f"Time budget of {time_budget} minutes used up, stopping after the tickers in flight")
+                return
+            indicators = [key for key, tickers in tickers_to_screen.items() if ticker in tickers]
+            if ticker_data is None:
+                print(f"Failed to fetch data for {ticker}, leaving it to the next run")
+            elif ticker_data.empty:
+                print(f"No data fetched for {ticker}, skipping")
+            # still counted in the progress by the write stage
+            yield ticker, ticker_data, indicators, stages
+
+    # Tickers without prices skip the evaluation. Yahoo having no rows for a ticker (delisted, unknown) is
+    # final for today, so it goes to the write stage as empty data; a failed download fails every
+    # indicator instead, which leaves them unmarked for the merge and the next run.
+    def unscreened(ticker, ticker_data, indicators, fetch_stages):
+        if ticker_data is None:
+            return ticker, {indicator: None for indicator in indicators}, fetch_stages
+        return ticker, None, fetch_stages
+
+    # opt-in, the selected indicator calls of every ticker run under cProfile and the slowest tickers are kept
+    if profile_indicators is None:
+        profile_indicators = profiling.parse_indicators(profiling.PROFILE_INDICATORS, INDICATORS)
+    profile_options = {}
+    if profile_indicators:
+        slowest_profiles = profiling.SlowestProfiles(profiling.profile_dir(checkpoint.run_date, shard), profile_top)
+        profile_options = {'profile_dir': slowest_profiles.directory, 'profile_indicators': profile_indicators}
+        print(f"Profiling {', '.join(sorted(profile_indicators))}, keeping the slowest {profile_top} tickers")
+
+    # evaluation stages come back from screen_ticker, merged with the fetch time of the same ticker
+    def screened(ticker, results, stages, profile, fetch_stages):
+        if profile:
+            slowest_profiles.add(ticker, *profile)
+        return ticker, results, {**fetch_stages, **stages}
+
+    metrics_log = metrics.MetricsLog(metrics_file or metrics.metrics_path(checkpoint.run_date, shard))
+    with metrics_log, checkpoint, db.BufferedUpserter(
+        batch_size=upsert_batch_size, on_written=mark_written, dry_run=dry_run
+    ) as writer:
+        with pipeline.QueueWorker(save_results, write_queue_size, name="write-stage") as write_stage:
+            fetched = pipeline.prefetch(screenable_tickers(), fetch_queue_size)
+            if workers == 1:
+                for ticker, ticker_data, indicators, fetch_stages in fetched:
+                    if ticker_data is None or ticker_data.empty:
+                        write_stage.put(unscreened(ticker, ticker_data, indicators, fetch_stages))
+                        continue
+                    write_stage.put(screened(
+                        *screen_ticker(ticker, ticker_data, indicators, horizons, **profile_options), fetch_stages
+                    ))
+            else:
+                print(f"Screening with {workers} worker processes")
+                # forkserver rather than fork: the fetch, prefetch and write threads are already running, and
+                # a worker forked while one of them holds a lock (stdout, urllib3's pool) could deadlock on it
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+                ) as executor:
+                    # future -> fetch stages of its ticker
+                    pending = {}
+                    for ticker, ticker_data, indicators, fetch_stages in fetched:
+                        if ticker_data is None or ticker_data.empty:
+                            write_stage.put(unscreened(ticker, ticker_data, indicators, fetch_stages))
+                            continue
+                        future = executor.submit(
+                            screen_ticker, ticker, ticker_data, indicators, horizons, **profile_options
+                        )
+                        pending[future] = fetch_stages
+                        # keep only a couple of tickers per worker in flight so downloaded frames don't pile up
+                        if len(pending) >= workers * 2:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                write_stage.put(screened(*future.result(), pending.pop(future)))
+                    for future in as_completed(pending):
+                        write_stage.put(screened(*future.result(), pending[future]))
+
+        # the writer is flushed by now, so its summary holds every upsert
+        writer.close()
+        metrics_log.record_upserts(writer.summary)
+
+    print(ps.format_stats())
+    print(writer.format_summary())
+    print(metrics_log.format_summary())
+    if profile_indicators:
+        slowest_profiles.write_index()
+        print(slowest_profiles.format_summary())
+
+    # picked up by merge_shard_results once every shard has finished; a line per attempt, so a re-run of
+    # the shard adds to the upserts of the attempts before it
+    with open(checkpoint_path(checkpoint.run_date, shard, extension="summary.jsonl"), "a") as f:
+        f.write(json.dumps({"tickers": len(stock_list), "price_store": ps.get_stats(), "upserts": writer.summary}) + "\n")
+
+
+def get_shard_name(shard_index, shard_count):
+    return f"shard-{shard_index}-of-{shard_count}" if shard_count > 1 else None
+
+
+# Final step of a sharded run: check every shard's checkpoint against its share of the tickers and add up
+# the shard summaries. Returns False when some shard did not finish.
+def merge_shard_results(run_date=None, shard_count=1):
+    run_date = run_date or date.today().isoformat()
+    all_tickers = tg.get_all_tickers()
+    complete = True
+    totals = {}
+    for shard_index in range(shard_count):
+        shard = get_shard_name(shard_index, shard_count)
+        expected = {
+            (ticker, indicator)
+            for ticker in tg.get_ticker_shard(all_tickers, shard_index, shard_count)
+            for indicator in INDICATORS
+        }
+        done = load_completed(checkpoint_path(run_date, shard)) & expected
+        complete = complete and len(done) == len(expected)
+        print(f"{shard or 'run'}: {len(done)}/{len(expected)} ticker indicators done")
+
+        summary_path = checkpoint_path(run_date, shard, extension="summary.jsonl")
+        if not os.path.exists(summary_path):
+            print(f"❌ No summary for {shard or 'run'}")
+            continue
+        with open(summary_path) as f:
+            summaries = [json.loads(line) for line in f if line.strip()]
+        for summary in summaries:
+            for table, table_summary in summary["upserts"].items():
+                table_totals = totals.setdefault(table, {})
+                for key, value in table_summary.items():
+                    table_totals[key] = table_totals.get(key, 0) + value
+
+    print("Merged upsert summary:")
+    for table, table_totals in sorted(totals.items()):
+        print(
+            f"  {table}: {table_totals['rows']} rows written, {table_totals['unchanged']} unchanged, "
+            f"{table_totals['failed']} failed, {table_totals['batches']} requests, {table_totals['seconds']:.1f}s"
+        )
+    return complete
+
+
+# Runs in a worker process: evaluate the requested indicators for one ticker and return only the
+# serializable analysis per indicator, so no DataFrames have to be shipped back. Also returns the seconds
+# spent per stage; "scan" is the indicator logic itself, without the aggregation, inflexion detection and
+# trap searches it triggers. With profile_indicators, those indicators run under cProfile and the
+# profile is dumped into profile_dir; the (seconds, path) of the dump is returned, otherwise None.
+def screen_ticker(
+    ticker, ticker_data, indicators, horizons=FORWARD_RETURN_HORIZONS, profile_dir=None, profile_indicators=()
+):
+    metrics.reset()
+    profiler = profiling.TickerProfiler() if set(indicators) & set(profile_indicators) else None
+    # shared by all indicators so the aggregation, SMAs and traps are computed once per ticker
+    feature_cache = ie.FeatureCache(ticker_data)
+    results = {}
+    for indicator in indicators:
+        get_dates_func = INDICATORS[indicator][0]
+        try:
+            with metrics.timer("scan"):
+                if profiler and indicator in profile_indicators:
+                    with profiler.measure():
+                        dates = get_dates_func(ticker_data, cache=feature_cache)
+                else:
+                    dates = get_dates_func(ticker_data, cache=feature_cache)
+            with metrics.timer("analysis"):
+                results[indicator] = get_analysis_results(dates, ticker_data, horizons)
+        except Exception as e:
+            print(f"❌ Failed to screen {indicator} for {ticker}: {e}")
+            results[indicator] = None
+    profile = (profiler.seconds, profiler.dump(profile_dir, ticker)) if profiler else None
+    return ticker, results, metrics.snapshot(), profile
+
+# allow_nan=False: NaN is not valid JSON for the analysis column, so one slipping through should fail loudly
+def get_analysis_hash(analysis_result):
+    return hashlib.sha256(json.dumps(analysis_result, sort_keys=True, allow_nan=False).encode()).hexdigest()
+
+
+# Materialised copy of the newest analysis entry, so alert_all can filter recent signals in the database
+def latest_signal_columns(analysis_result):
+    latest_date = max(analysis_result)
+    return {
+        'latest_signal_date': latest_date,
+        'latest_close': analysis_result[latest_date].get('close'),
+        'latest_volume': analysis_result[latest_date].get('volume'),
+    }
+
+# Forward returns in percent over every horizon (in trading days), one column per horizon. Rows whose
+# horizon runs past the last bar are NaN, see forward_returns_valid.
+def get_forward_returns(close, horizons):
+    returns = np.full((len(close), len(horizons)), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for column, k in enumerate(horizons):
+            if 0 < k < len(close):
+                returns[:-k, column] = (close[k:] - close[:-k]) / close[:-k] * 100
+    return returns
+
+
+def finite_or_none(values):
+    return [value if math.isfinite(value) else None for value in values.tolist()]
+
+
+def get_analysis_results(dates, data, horizons=FORWARD_RETURN_HORIZONS):
     analysis_results = {}
-    if dates is None:
+    if dates is None or len(dates) == 0:
         return analysis_results
-    
-    for date in dates:
-        date_index = data.index.get_loc(date)
-        if date_index != -1:
-            date_str = date.strftime('%Y-%m-%d')
-            analysis_results[date_str] = {}
-            analysis_results[date_str]['change1TD'] = ((data.iloc[date_index + 1]['Close'] - data.iloc[date_index]['Close']) / data.iloc[date_index]['Close']) * 100 if date_index + 1 < len(data) else None
-            analysis_results[date_str]['change5TD'] = ((data.iloc[date_index + 5]['Close'] - data.iloc[date_index]['Close']) / data.iloc[date_index]['Close']) * 100 if date_index + 5 < len(data) else None
-            analysis_results[date_str]['change20TD'] = ((data.iloc[date_index + 20]['Close'] - data.iloc[date_index]['Close']) / data.iloc[date_index]['Close']) * 100 if date_index + 20 < len(data) else None
-            analysis_results[date_str]['volume'] = data.iloc[date_index]['Volume']
-            analysis_results[date_str]['close'] = data.iloc[date_index]['Close']
-    
+
+    positions = data.index.get_indexer(dates)
+    positions = positions[positions != -1]
+    close = data['Close'].to_numpy(dtype=float)
+    # a row of the original frame is upcast to float, so volumes have always been stored as floats
+    volume = data['Volume'].to_numpy(dtype=float)
+
+    # one gather for all signals instead of a row lookup per signal and horizon
+    returns = get_forward_returns(close, horizons)[positions]
+    # horizons past the last bar, and returns over missing or zero prices, are stored as None
+    valid = (positions[:, None] + np.asarray(horizons) < len(close)) & np.isfinite(returns)
+    keys = [f'change{k}TD' for k in horizons]
+
+    # tolist() hands back plain Python floats, so the result is JSON-ready as built
+    for date, row, row_valid, signal_volume, signal_close in zip(
+        data.index[positions].strftime('%Y-%m-%d'),
+        returns.tolist(),
+        valid.tolist(),
+        finite_or_none(volume[positions]),
+        finite_or_none(close[positions]),
+    ):
+        analysis_results[date] = {
+            key: value if value_valid else None for key, value, value_valid in zip(keys, row, row_valid)
+        }
+        analysis_results[date]['volume'] = signal_volume
+        analysis_results[date]['close'] = signal_close
+
     return analysis_results
 
-def convert_to_serializable(data):
-    if isinstance(data, dict):
-        return {k: convert_to_serializable(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [convert_to_serializable(i) for i in data]
-    elif isinstance(data, pd.Timestamp):
-        return data.isoformat()
-    elif isinstance(data, np.int64):
-        return int(data)
-    elif isinstance(data, np.float64):
-        return float(data)
-    else:
-        return data
-
-calculate_and_save_indicator_results()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--fetch-workers", type=int, default=4, help="price chunks downloaded at the same time")
+    parser.add_argument("--fetch-queue-size", type=int, default=None, help="downloaded tickers waiting for evaluation, defaults to 2 per worker")
+    parser.add_argument("--write-queue-size", type=int, default=100, help="screened tickers waiting to be written")
+    parser.add_argument("--upsert-batch-size", type=int, default=200, help="rows per upsert request")
+    parser.add_argument("--run-date", default=None, help="checkpoint to resume, defaults to today (YYYY-MM-DD)")
+    parser.add_argument("--time-budget", type=float, default=None, help="minutes after which no new tickers are started")
+    parser.add_argument("--horizons", type=int, nargs="+", default=FORWARD_RETURN_HORIZONS, help="trading days of the stored forward returns")
+    parser.add_argument("--shard-index", type=int, default=0, help="which part of the tickers this run screens")
+    parser.add_argument("--shard-count", type=int, default=1, help="number of parts the tickers are split into")
+    parser.add_argument("--merge", action="store_true", help="combine the results of all shards instead of screening")
+    parser.add_argument("--data-provider", choices=list(tg.PROVIDERS), default=tg.DATA_PROVIDER, help="where prices come from")
+    parser.add_argument("--dry-run", action="store_true", help="screen without reading from or writing to the database")
+    parser.add_argument("--profile", nargs="*", choices=list(INDICATORS), default=None, help="run these indicators (all when none are named) under cProfile")
+    parser.add_argument("--profile-top", type=int, default=profiling.PROFILE_TOP, help="profiles of the slowest tickers to keep")
+    parser.add_argument("--metrics-file", default=None, help="JSON-lines file for the stage timings, defaults to metrics/<run date>.jsonl")
+    args = parser.parse_args()
+    if args.data_provider == "synthetic" and not args.dry_run:
+        parser.error("synthetic prices must never reach the database, add --dry-run")
+    tg.set_data_provider(args.data_provider)
+    if args.merge:
+        sys.exit(0 if merge_shard_results(run_date=args.run_date, shard_count=args.shard_count) else 1)
+    calculate_and_save_indicator_results(
+        workers=args.workers,
+        upsert_batch_size=args.upsert_batch_size,
+        run_date=args.run_date,
+        time_budget=args.time_budget,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        fetch_workers=args.fetch_workers,
+        fetch_queue_size=args.fetch_queue_size,
+        write_queue_size=args.write_queue_size,
+        horizons=tuple(args.horizons),
+        dry_run=args.dry_run,
+        metrics_file=args.metrics_file,
+        profile_indicators=None if args.profile is None else set(args.profile or INDICATORS),
+        profile_top=args.profile_top,
+    )
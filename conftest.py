@@ -0,0 +1 @@
+# Puts the repository root on sys.path for the tests under tests/, so plain `pytest` can import utils
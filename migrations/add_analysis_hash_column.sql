@@ -0,0 +1,6 @@
+-- Content hash of the analysis JSON, written by calculate_and_save_indicator_results.py so rows whose
+-- analysis did not change since the previous run are not rewritten.
+alter table apex_bull_appear add column if not exists analysis_hash text;
+alter table apex_bull_raging add column if not exists analysis_hash text;
+alter table apex_bear_appear add column if not exists analysis_hash text;
+alter table apex_bear_raging add column if not exists analysis_hash text;
@@ -0,0 +1,28 @@
+-- Latest signal of each ticker, written by calculate_and_save_indicator_results.py alongside the
+-- analysis JSON so alert_all.py can filter recent signals in the database.
+do $$
+declare
+    indicator_table text;
+begin
+    foreach indicator_table in array array['apex_bull_appear', 'apex_bull_raging', 'apex_bear_appear', 'apex_bear_raging']
+    loop
+        execute format('alter table %I add column if not exists latest_signal_date date', indicator_table);
+        execute format('alter table %I add column if not exists latest_close double precision', indicator_table);
+        execute format('alter table %I add column if not exists latest_volume double precision', indicator_table);
+        execute format('create index if not exists %I on %I (latest_signal_date)', indicator_table || '_latest_signal_date_idx', indicator_table);
+
+        -- backfill rows written before these columns existed
+        execute format($sql$
+            update %I set
+                latest_signal_date = latest.signal_date::date,
+                latest_close = (analysis -> latest.signal_date ->> 'close')::double precision,
+                latest_volume = (analysis -> latest.signal_date ->> 'volume')::double precision
+            from (
+                select ticker as latest_ticker, (select max(key) from jsonb_object_keys(analysis) as key) as signal_date
+                from %I
+            ) as latest
+            where ticker = latest.latest_ticker and latest.signal_date is not null
+        $sql$, indicator_table, indicator_table);
+    end loop;
+end
+$$;
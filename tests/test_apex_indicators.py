@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+import utils.indicator_evaluator as ie
+import utils.synthetic_market as sm
+
+# Signal dates of the apex indicators on fixed synthetic histories, as given by the loop-based
+# implementations before the scans were rewritten over arrays. The rewrites keep their quirks on purpose
+# (the signal is the reversal bar, bear appear exits on a higher low, a bar breaking out of the kangaroo
+# on both sides is an exit, repeated dates are kept), so any change here is a change in the signals.
+
+TICKERS = ("SYN00000", "SYN00001", "SYN00002", "SYN00003")
+BARS = 2500
+END_DATE = "2024-12-31"
+
+BULL_APPEAR_DATES = {
+    "SYN00000": ["2015-11-05", "2017-07-13", "2023-10-31"],
+    "SYN00001": ["2020-07-22", "2021-07-30", "2021-09-16", "2023-06-26", "2023-06-26", "2023-10-06"],
+    "SYN00002": ["2020-06-25", "2020-10-14", "2020-10-14"],
+    "SYN00003": [
+        "2017-08-24", "2017-09-19", "2021-07-28", "2021-10-08", "2021-12-14", "2021-12-22", "2023-09-07",
+    ],
+}
+
+BEAR_APPEAR_DATES = {
+    "SYN00000": [],
+    "SYN00001": [],
+    "SYN00002": ["2018-06-11", "2021-07-28"],
+    "SYN00003": ["2018-06-12"],
+}
+
+BULL_RAGING_DATES = {
+    "SYN00000": ["2015-06-23", "2018-05-15", "2020-04-06", "2020-07-23", "2023-09-13"],
+    "SYN00001": ["2018-07-02", "2020-01-30", "2023-03-10", "2023-05-25", "2024-04-05"],
+    "SYN00002": ["2015-12-11", "2016-03-02", "2016-05-24", "2017-02-17", "2018-07-30", "2023-10-19"],
+    "SYN00003": [
+        "2015-07-24", "2016-12-19", "2018-09-11", "2018-12-06", "2018-12-06", "2020-01-29", "2021-09-02",
+        "2023-07-21", "2023-07-21", "2024-09-20",
+    ],
+}
+
+BEAR_RAGING_DATES = {
+    "SYN00000": ["2016-12-14", "2018-07-04", "2021-08-18", "2024-09-20", "2024-11-05"],
+    "SYN00001": [
+        "2016-03-30", "2017-03-01", "2017-04-25", "2018-06-18", "2021-11-11", "2022-10-17", "2024-09-30",
+        "2024-10-18",
+    ],
+    "SYN00002": [
+        "2015-06-22", "2016-12-05", "2017-01-16", "2020-01-29", "2020-03-11", "2020-04-06", "2021-08-18",
+        "2021-11-09", "2024-09-25",
+    ],
+    "SYN00003": ["2023-03-02"],
+}
+
+
+@pytest.fixture(scope="module", params=TICKERS)
+def history(request):
+    return request.param, sm.generate_prices(request.param, bars=BARS, end=END_DATE)
+
+
+def test_bull_appear_dates(history):
+    ticker, data = history
+    pd.testing.assert_index_equal(
+        ie.get_apex_bull_appear_dates(data), pd.DatetimeIndex(BULL_APPEAR_DATES[ticker])
+    )
+
+
+def test_bear_appear_dates(history):
+    ticker, data = history
+    pd.testing.assert_index_equal(
+        ie.get_apex_bear_appear_dates(data), pd.DatetimeIndex(BEAR_APPEAR_DATES[ticker])
+    )
+
+
+# the indicators of one ticker share a FeatureCache in the pipeline, which must not change their dates
+def test_appear_dates_with_shared_cache(history):
+    ticker, data = history
+    cache = ie.FeatureCache(data)
+    ie.get_apex_bear_appear_dates(data, cache=cache)
+    pd.testing.assert_index_equal(
+        ie.get_apex_bull_appear_dates(data, cache=cache), pd.DatetimeIndex(BULL_APPEAR_DATES[ticker])
+    )
+
+
+def test_bull_raging_dates(history):
+    ticker, data = history
+    assert ie.get_apex_bull_raging_dates(data) == list(pd.DatetimeIndex(BULL_RAGING_DATES[ticker]))
+
+
+def test_bear_raging_dates(history):
+    ticker, data = history
+    assert ie.get_apex_bear_raging_dates(data) == list(pd.DatetimeIndex(BEAR_RAGING_DATES[ticker]))
+
+
+# an empty download has no columns at all, the scans report no signals instead of failing
+def test_empty_history():
+    data = pd.DataFrame()
+    assert ie.get_apex_bull_raging_dates(data) == []
+    assert ie.get_apex_bear_raging_dates(data) == []
+    assert ie.get_apex_bull_appear_dates(data) is None
+    assert ie.get_apex_bear_appear_dates(data) is None
@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import utils.indicator_evaluator as ie
+import utils.indicator_utils as iu
+import utils.synthetic_market as sm
+import calculate_and_save_indicator_results as pipeline
+
+# Times the indicator engine on synthetic histories, so results can be compared across commits:
+#
+#   python -m utils.benchmark --output bench.json
+#
+# Every get_*_dates function of utils.indicator_evaluator and the helpers of utils.indicator_utils are
+# timed per history length, and the per-ticker screening over batches of tickers. Each entry reports the
+# median and fastest call, bars per second and the peak memory of one call (measured in a separate,
+# traced call, since tracemalloc slows everything down).
+
+SIZES = (1000, 5000, 20000)
+BATCH_SIZES = (10, 100)
+BATCH_BARS = 5000
+REPEAT = 3
+# fixed, so every run benchmarks the same histories
+END_DATE = "2024-12-31"
+
+
+def get_dates_functions():
+    return {
+        name: func
+        for name, func in inspect.getmembers(ie, inspect.isfunction)
+        if name.startswith("get_") and name.endswith("_dates")
+    }
+
+
+# Each benchmark is a function taking a history and returning the call to time, so the setup it needs
+# (aggregated bars, inflexion points, signal dates) stays out of the timing
+def call_with_data(func):
+    return lambda data: lambda: func(data)
+
+
+def call_with_2day_bars(func):
+    def prepare(data):
+        bars = iu.get_2day_aggregated_data(data)
+        return lambda: func(bars)
+    return prepare
+
+
+def call_with_traps(func, kind):
+    def prepare(data):
+        bars = iu.get_2day_aggregated_data(data)
+        traps = iu.get_low_inflexion_points(bars) if kind == "bear" else iu.get_high_inflexion_points(bars)
+        return lambda: func(bars, traps)
+    return prepare
+
+
+def call_analysis_results(data):
+    dates = ie.get_apex_bull_raging_dates(data)
+    return lambda: pipeline.get_analysis_results(dates, data)
+
+
+def get_benchmarks():
+    benchmarks = {name: call_with_data(func) for name, func in get_dates_functions().items()}
+    benchmarks.update({
+        "get_2day_aggregated_data": call_with_data(iu.get_2day_aggregated_data),
+        "get_low_inflexion_points": call_with_2day_bars(iu.get_low_inflexion_points),
+        "get_high_inflexion_points": call_with_2day_bars(iu.get_high_inflexion_points),
+        "get_trap_index": call_with_traps(lambda bars, traps: iu.get_trap_index(traps, "bear"), "bear"),
+        "find_bear_traps": call_with_traps(
+            lambda bars, traps: iu.find_bear_traps(traps, bars.index[0], bars.index[-1]), "bear"
+        ),
+        "find_bull_traps": call_with_traps(
+            lambda bars, traps: iu.find_bull_traps(traps, bars.index[0], bars.index[-1]), "bull"
+        ),
+        "find_lowest_bear_trap_within_price_range": call_with_traps(
+            lambda bars, traps: iu.find_lowest_bear_trap_within_price_range(
+                traps, bars.index[-1], bars["Low"].min(), bars["High"].max()
+            ),
+            "bear",
+        ),
+        "find_highest_bull_trap_within_price_range": call_with_traps(
+            lambda bars, traps: iu.find_highest_bull_trap_within_price_range(
+                traps, bars.index[-1], bars["Low"].min(), bars["High"].max()
+            ),
+            "bull",
+        ),
+        "get_analysis_results": call_analysis_results,
+    })
+    return benchmarks
+
+
+# The uptrend/downtrend scans print as they go, which would end up in the JSON report on stdout and in the
+# timings, so stdout is discarded while the calls run
+def measure(call, repeat):
+    timings = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - start_time)
+
+        tracemalloc.start()
+        try:
+            call()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "repeat": repeat,
+        "latency_median_s": statistics.median(timings),
+        "latency_min_s": min(timings),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def benchmark_functions(sizes, repeat, match=None):
+    results = []
+    for bars in sizes:
+        data = sm.generate_prices("BENCH", bars=bars, end=END_DATE)
+        for name, prepare in get_benchmarks().items():
+            if match and match not in name:
+                continue
+            print(f"{name} over {bars} bars", file=sys.stderr)
+            result = measure(prepare(data), repeat)
+            results.append({
+                "name": name,
+                "bars": len(data),
+                **result,
+                "bars_per_second": len(data) / result["latency_median_s"] if result["latency_median_s"] else None,
+            })
+    return results
+
+
+# The work of one nightly worker: all four apex indicators and their analysis for every ticker of a batch
+def benchmark_batches(batch_sizes, bars, repeat):
+    results = []
+    for tickers in batch_sizes:
+        batch = {ticker: sm.generate_prices(ticker, bars=bars, end=END_DATE) for ticker in sm.get_tickers(tickers)}
+        print(f"screen_ticker over {tickers} tickers of {bars} bars", file=sys.stderr)
+        result = measure(
+            lambda: [pipeline.screen_ticker(ticker, data, list(pipeline.INDICATORS)) for ticker, data in batch.items()],
+            repeat,
+        )
+        total_bars = sum(len(data) for data in batch.values())
+        results.append({
+            "name": "screen_ticker_batch",
+            "tickers": tickers,
+            "bars": total_bars,
+            **result,
+            "tickers_per_second": tickers / result["latency_median_s"] if result["latency_median_s"] else None,
+            "bars_per_second": total_bars / result["latency_median_s"] if result["latency_median_s"] else None,
+        })
+    return results
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def format_results(results):
+    lines = [f"{'benchmark':<45} {'bars':>8} {'median ms':>11} {'bars/s':>12} {'peak MiB':>9}"]
+    for result in results:
+        name = result["name"] + (f" x{result['tickers']}" if "tickers" in result else "")
+        lines.append(
+            f"{name:<45} {result['bars']:>8} {result['latency_median_s'] * 1000:>11.2f} "
+            f"{result['bars_per_second'] or 0:>12,.0f} {result['peak_memory_bytes'] / 2 ** 20:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the indicator engine on synthetic prices")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="history lengths in bars")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=BATCH_SIZES, help="tickers per batch, none to skip")
+    parser.add_argument("--batch-bars", type=int, default=BATCH_BARS, help="history length of the batch tickers")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed calls per benchmark")
+    parser.add_argument("--match", default=None, help="only run the functions whose name contains this")
+    parser.add_argument("--output", default=None, help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+    # the uptrend/downtrend scans index Series by position, which warns on every call
+    warnings.simplefilter("ignore", FutureWarning)
+
+    results = benchmark_functions(args.sizes, args.repeat, args.match)
+    if not args.match:
+        results += benchmark_batches(args.batch_sizes, args.batch_bars, args.repeat)
+    report = {"metadata": get_metadata(), "results": results}
+
+    print(format_results(results), file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
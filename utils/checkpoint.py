@@ -0,0 +1,70 @@
+import json
+import os
+from datetime import date
+
+# One JSON-lines file per run date (and shard), listing the (ticker, indicator) pairs that are done
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+
+
+def checkpoint_path(run_date, shard=None, extension="jsonl"):
+    name = f"{run_date}.{shard}" if shard else run_date
+    return os.path.join(CHECKPOINT_DIR, f"{name}.{extension}")
+
+
+def load_completed(path):
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            completed.add((entry["ticker"], entry["indicator"]))
+    return completed
+
+
+# Completed (ticker, indicator) pairs of one run date. A pair is only marked once its result is safely
+# in the database, and every line is flushed as it is written, so a restarted run can skip them.
+class Checkpoint:
+    def __init__(self, run_date=None, shard=None):
+        self.run_date = run_date or date.today().isoformat()
+        self.path = checkpoint_path(self.run_date, shard)
+        self.completed = load_completed(self.path)
+
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        self.file = open(self.path, "a")
+        # a killed run may have left half a line behind, start on a fresh one
+        if self.file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_done(self, ticker, indicator):
+        return (ticker, indicator) in self.completed
+
+    # status is only recorded for pairs done without a result, such as tickers without price data
+    def mark(self, ticker, indicator, status=None):
+        self.completed.add((ticker, indicator))
+        entry = {"ticker": ticker, "indicator": indicator}
+        if status:
+            entry["status"] = status
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    # checkpoints of earlier run dates are never resumed, other shards of this date are left alone
+    def prune(self):
+        for name in os.listdir(CHECKPOINT_DIR):
+            if not name.startswith(f"{self.run_date}."):
+                os.remove(os.path.join(CHECKPOINT_DIR, name))
@@ -1,28 +1,134 @@
+import numpy as np
 import pandas as pd
 from typing import List, Dict
 import streamlit as st
 from datetime import datetime
 import utils.ticker_getter as tg
 import utils.supabase as db
+import utils.metrics as metrics
 
 from utils.indicator_utils import (
-    get_2day_aggregated_data,
+    get_n_day_aggregated_data,
     get_high_inflexion_points,
     get_low_inflexion_points,
     find_lowest_bear_trap_within_price_range,
     find_highest_bull_trap_within_price_range,
     find_bear_traps,
     find_bull_traps,
+    RangeMinimum,
+    TrapIndex,
 )
 
 
+# Lazily computed series for one ticker, memoized by (kind, params, timeframe) where timeframe is
+# the number of daily bars per aggregated bar. Evaluate every indicator of a ticker against the same
+# cache so each SMA, EMA, std and aggregation is computed once. Columns and derived series are handed
+# out as read-only NumPy arrays and the input DataFrame is never modified or copied.
+class FeatureCache:
+    def __init__(self, data):
+        self.data = data
+        self.index = data.index
+        self.features = {}
+
+    def get(self, kind, params, timeframe, compute):
+        key = (kind, params, timeframe)
+        if key not in self.features:
+            self.features[key] = compute()
+        return self.features[key]
+
+    def bars(self, timeframe=1):
+        if timeframe == 1:
+            return self.data
+        return self.get(
+            "bars", (), timeframe, lambda: metrics.timed("aggregation", get_n_day_aggregated_data, self.data, timeframe)
+        )
+
+    def column(self, name, timeframe=1):
+        return self.get("column", (name,), timeframe, lambda: read_only(self.bars(timeframe)[name].to_numpy()))
+
+    def sma(self, window, column="Close", timeframe=1):
+        return self.get(
+            "sma", (column, window), timeframe,
+            lambda: read_only(self.bars(timeframe)[column].rolling(window=window).mean().to_numpy()),
+        )
+
+    def std(self, window, column="Close", timeframe=1):
+        return self.get(
+            "std", (column, window), timeframe,
+            lambda: read_only(self.bars(timeframe)[column].rolling(window=window).std().to_numpy()),
+        )
+
+    def ema(self, span, column="Close", timeframe=1):
+        return self.get(
+            "ema", (column, span), timeframe,
+            lambda: read_only(self.bars(timeframe)[column].ewm(span=span, adjust=False).mean().to_numpy()),
+        )
+
+    def macd(self, short_window=12, long_window=26, signal_window=9, timeframe=1):
+        def compute():
+            macd = self.ema(short_window, timeframe=timeframe) - self.ema(long_window, timeframe=timeframe)
+            signal_line = pd.Series(macd).ewm(span=signal_window, adjust=False).mean().to_numpy()
+            return read_only(macd), read_only(signal_line)
+
+        return self.get("macd", (short_window, long_window, signal_window), timeframe, compute)
+
+    def rsi(self, com=13, timeframe=1):
+        def compute():
+            delta = self.bars(timeframe)["Close"].diff()
+            gain = delta.where(delta > 0, 0)
+            loss = -delta.where(delta < 0, 0)
+            avg_gain = gain.ewm(com=com, adjust=False).mean()
+            avg_loss = loss.ewm(com=com, adjust=False).mean()
+            rs = avg_gain / avg_loss
+            return read_only((100 - (100 / (1 + rs))).to_numpy())
+
+        return self.get("rsi", (com,), timeframe, compute)
+
+    def low_inflexion_points(self, timeframe=2):
+        return self.get(
+            "low_inflexion_points", (), timeframe,
+            lambda: metrics.timed("inflexion", get_low_inflexion_points, self.bars(timeframe)),
+        )
+
+    def high_inflexion_points(self, timeframe=2):
+        return self.get(
+            "high_inflexion_points", (), timeframe,
+            lambda: metrics.timed("inflexion", get_high_inflexion_points, self.bars(timeframe)),
+        )
+
+    def bear_trap_index(self, timeframe=2):
+        return self.get(
+            "bear_trap_index", (), timeframe,
+            lambda: metrics.timed("trap_search", TrapIndex, self.low_inflexion_points(timeframe), "bear"),
+        )
+
+    def bull_trap_index(self, timeframe=2):
+        return self.get(
+            "bull_trap_index", (), timeframe,
+            lambda: metrics.timed("trap_search", TrapIndex, self.high_inflexion_points(timeframe), "bull"),
+        )
+
+
+# a view that shares memory with the source but cannot be written through
+def read_only(values):
+    values = values.view()
+    values.flags.writeable = False
+    return values
+
+
+# same as pandas' Series.shift(1): the first value becomes NaN
+def previous(values):
+    return np.concatenate(([np.nan], values[:-1]))
+
+
 def analyze_everything(settings: Dict[str, int]) -> Dict[str, Dict[str, List[str]]]:
     enabled_settings = {
         k: v for k, v in settings["indicator_settings"].items() if v["is_enabled"]
     }
     data = []
     for indicator, config in enabled_settings.items():
-        data = db.fetch_cached_data_from_supabase(indicator)
+        # streamed lazily, only the rows of the table that is iterated below are fetched
+        data = db.iter_table_rows(indicator, columns="ticker, analysis")
 
     # step 1; return all data.analysis keys as array
 
@@ -54,17 +160,17 @@ def analyze_everything(settings: Dict[str, int]) -> Dict[str, Dict[str, List[str
         for date_key in ticker_data["analysis"]:
             date_value = ticker_data["analysis"][date_key]
             # Calculate the success rate based on provided logic
-            if date_value["change1TD"] is not None:
+            if date_value.get("change1TD") is not None:
                 if date_value["change1TD"] > 0:
                     total_success_count_1D += 1
                 total_percentage_change_1D += date_value["change1TD"]
 
-            if date_value["change5TD"] is not None:
+            if date_value.get("change5TD") is not None:
                 if date_value["change5TD"] > 0:
                     total_success_count_5D += 1
                 total_percentage_change_5D += date_value["change5TD"]
 
-            if date_value["change20TD"] is not None:
+            if date_value.get("change20TD") is not None:
                 if date_value["change20TD"] > 0:
                     total_success_count_20D += 1
                 total_percentage_change_20D += date_value["change20TD"]
@@ -129,230 +235,111 @@ def analyze_everything(settings: Dict[str, int]) -> Dict[str, Dict[str, List[str
     return response
 
 
-def get_apex_bull_raging_dates(data):
-    data = get_2day_aggregated_data(data)
-
-    high_inflexion_points = get_high_inflexion_points(data)
-    potential_bear_traps = get_low_inflexion_points(data)
-
-    future_bear_traps = potential_bear_traps.copy()
-
-    bull_raging_dates = []
-
-    for high_point in high_inflexion_points:
-        high_point_date, high_point_value = high_point
-        # print(f"************ checking {high_point_date}: ************")
-        if high_point_date not in data.index:
-            continue
-
-        # Find the stopping point (which is the next bear trap)
-        stopping_point_date = next(
-            (
-                trap[0]
-                for trap in future_bear_traps
-                if trap[0] > high_point_date and trap[1] < high_point_value
-            ),
-            data.index[-1],
+# The raging scans over arrays. For a bull raging setup, from every high inflexion point up to the
+# stopping point (the next bear trap below it):
+#   - the previous bear trap is the lowest valid one within price range,
+#   - the first flush down bar starts above the mid point between the trap and the high,
+#   - at least 5 bars with 30% of them flushing down, and one breaking below the trap,
+#   - within 6 bars of the break, a bullish bar closes back above the trap.
+# Bear raging is the same upside down. Flush flags are prefix summed, the next flush bar, stopping point
+# and first break are looked up in precomputed arrays or range-minimum tables, so each inflexion point
+# costs O(log n) and only the 6 bars after the break are looked at one by one.
+def scan_raging(cache, kind):
+    data = cache.bars(2)
+    if "Close" not in data.columns:
+        return []
+    opens, highs, lows, closes = (cache.column(name, 2) for name in ("Open", "High", "Low", "Close"))
+    n = len(data)
+    bar_range = highs - lows
+    if kind == "bull":
+        points = cache.high_inflexion_points()
+        trap_index = cache.bear_trap_index()
+        flush = (opens - closes) > 0.7 * bar_range
+        reclaim = (closes - opens > 0.5 * bar_range) | (
+            (opens > lows + 4 / 5 * bar_range) & (closes > lows + 4 / 5 * bar_range)
         )
-        future_bear_traps = [
-            trap for trap in future_bear_traps if trap[0] >= high_point_date
-        ]
-
-        # print(f"stopping point date: {stopping_point_date}")
-
-        previous_bear_trap = find_lowest_bear_trap_within_price_range(
-            tuple(potential_bear_traps),
-            high_point_date,
-            data.loc[stopping_point_date]["Low"],
-            high_point_value,
+        # the first bar breaking below the trap is the first low under it, NaN lows never break
+        breaks = RangeMinimum(np.where(np.isnan(lows), np.inf, lows))
+    else:
+        points = cache.low_inflexion_points()
+        trap_index = cache.bull_trap_index()
+        flush = (closes - opens) > 0.7 * bar_range
+        reclaim = (opens - closes > 0.5 * bar_range) | (
+            (opens < highs - 4 / 5 * bar_range) & (closes < highs - 4 / 5 * bar_range)
         )
-
-        if previous_bear_trap is None:
-            # print("❌ no previous bear trap found")
+        breaks = RangeMinimum(np.where(np.isnan(highs), np.inf, -highs))
+    if not points or n == 0:
+        return []
+
+    flush_count = np.concatenate(([0], np.cumsum(flush)))
+    # position of the first flush bar at or after each bar, n when there is none
+    next_flush = np.minimum.accumulate(np.where(flush, np.arange(n), n)[::-1])[::-1]
+    point_rows = data.index.get_indexer([date for date, _ in points])
+    trap_rows = data.index.get_indexer([date for date, _ in trap_index.traps])
+
+    raging_dates = []
+    for (point_date, point_value), row in zip(points, point_rows.tolist()):
+        if row < 0:
             continue
-        # print(f"previous_bear_trap: {previous_bear_trap}")
-
-        mid_point = (
-            previous_bear_trap[1] + (high_point_value - previous_bear_trap[1]) / 2
-        )
 
-        # Analyze the range from high point to stopping point
-        range_data = data.loc[high_point_date:stopping_point_date]
-        flush_down_mask = (range_data["Open"] - range_data["Close"]) > 0.7 * (
-            range_data["High"] - range_data["Low"]
+        # the stopping point is the next trap (valid or not) beyond the inflexion point, else the last bar
+        first_later_trap = int(np.searchsorted(trap_index.dates, pd.Timestamp(point_date).value, side="right"))
+        stop_trap = trap_index.first_position_below(
+            first_later_trap, len(trap_index.keys) - 1, point_value if kind == "bull" else -point_value
         )
-        flush_down_bars = range_data[flush_down_mask]
+        stop = int(trap_rows[stop_trap]) if stop_trap is not None else n - 1
 
-        if flush_down_bars.empty or flush_down_bars.iloc[0]["High"] < mid_point:
-            # print(
-            #     "❌ first flush down started after mid point, or didn't happen at all"
-            # )
+        if kind == "bull":
+            previous_trap = find_lowest_bear_trap_within_price_range(trap_index, point_date, lows[stop], point_value)
+        else:
+            previous_trap = find_highest_bull_trap_within_price_range(trap_index, point_date, point_value, highs[stop])
+        if previous_trap is None:
             continue
-        # print(
-        #     f"✅ first flush down started at {flush_down_bars.iloc[0]['High']} before mid point {mid_point}"
-        # )
-
-        # Find the date which broke below bear trap
-        break_below_bear_trap = range_data.index[
-            range_data["Low"] < previous_bear_trap[1]
-        ]
-        if break_below_bear_trap.empty:
-            # print(
-            #     f"❌ no break below bear trap {previous_bear_trap} before the price reaches stopping point"
-            # )
+        trap_value = previous_trap[1]
+        mid_point = trap_value + (point_value - trap_value) / 2
+
+        first_flush = next_flush[row]
+        if first_flush > stop:
             continue
-        date_which_broke_below_bear_trap = break_below_bear_trap[0]
-        # print(
-        #     f"✅ date_which_broke_below_bear_trap: {date_which_broke_below_bear_trap}"
-        # )
-
-        total_bar_count = len(range_data)
-        flush_down_count = flush_down_mask.sum()
-        if total_bar_count < 5 or flush_down_count / total_bar_count < 0.3:
-            # print(
-            #     f"❌ less than 5 bars or not majority flush down, flush down bars: {flush_down_count}, total bars: {total_bar_count}"
-            # )
+        if highs[first_flush] < mid_point if kind == "bull" else lows[first_flush] > mid_point:
             continue
-        # print(
-        #     f"✅ > 5 bars and majority flush down, flush down bars: {flush_down_count}, total bars: {total_bar_count}"
-        # )
-
-        # Check 6 bars after break below bear trap
-        post_break_data = data.loc[date_which_broke_below_bear_trap:].head(6)
-        for i, (date, row) in enumerate(post_break_data.iterrows(), 1):
-            if row["Close"] > previous_bear_trap[1] and (
-                row["Close"] - row["Open"] > 0.5 * (row["High"] - row["Low"])
-                or (
-                    row["Open"] > row["Low"] + 4 / 5 * (row["High"] - row["Low"])
-                    and row["Close"] > row["Low"] + 4 / 5 * (row["High"] - row["Low"])
-                )
-            ):
-                # print(
-                #     f"🚀 {date} closed at {row['Close']}; above bear trap. All Conditions met!"
-                # )
-                bull_raging_dates.append(date)
-                break
-            # else:
-            # print(f"❌ check bar {i}, no bullish bar closing above stop loss zone")
-
-    return bull_raging_dates
-
 
-def get_apex_bear_raging_dates(data):
-    data = get_2day_aggregated_data(data)
-
-    low_inflexion_points = get_low_inflexion_points(data)
-    potential_bull_traps = get_high_inflexion_points(data)
-
-    future_bull_traps = potential_bull_traps.copy()
-
-    bear_raging_dates = []
+        broke = breaks.first_position_below(row, stop, trap_value if kind == "bull" else -trap_value)
+        if broke is None:
+            continue
 
-    for low_point in low_inflexion_points:
-        low_point_date, low_point_value = low_point
-        # print(f"************ checking {low_point_date}: ************")
-        if low_point_date not in data.index:
+        total_bar_count = stop - row + 1
+        if total_bar_count < 5 or (flush_count[stop + 1] - flush_count[row]) / total_bar_count < 0.3:
             continue
 
-        # Find the stopping point (which is the next bull trap) - TODO: might not be true. as long as majority flush up, keep goings
-        stopping_point_date = next(
-            (
-                trap[0]
-                for trap in future_bull_traps
-                if trap[0] > low_point_date and trap[1] > low_point_value
-            ),
-            data.index[-1],
-        )
-        future_bull_traps = [
-            trap for trap in future_bull_traps if trap[0] >= low_point_date
-        ]
+        post_break = slice(broke, broke + 6)
+        closed_back = closes[post_break] > trap_value if kind == "bull" else closes[post_break] < trap_value
+        reclaimed = np.flatnonzero(closed_back & reclaim[post_break])
+        if len(reclaimed):
+            raging_dates.append(data.index[broke + reclaimed[0]])
 
-        # print(f"stopping point date: {stopping_point_date}")
+    return raging_dates
 
-        previous_bull_trap = find_highest_bull_trap_within_price_range(
-            tuple(potential_bull_traps),
-            low_point_date,
-            low_point_value,
-            data.loc[stopping_point_date]["High"],
-        )
 
-        if previous_bull_trap is None:
-            # print("❌ no previous bull trap found")
-            continue
-        # print(f"previous_bull_trap: {previous_bull_trap}")
+def get_apex_bull_raging_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return scan_raging(cache, "bull")
 
-        mid_point = (
-            previous_bull_trap[1] + (low_point_value - previous_bull_trap[1]) / 2
-        )
 
-        # Analyze the range from low point to stopping point
-        range_data = data.loc[low_point_date:stopping_point_date]
-        flush_up_mask = (range_data["Close"] - range_data["Open"]) > 0.7 * (
-            range_data["High"] - range_data["Low"]
-        )
-        flush_up_bars = range_data[flush_up_mask]
+def get_apex_bear_raging_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return scan_raging(cache, "bear")
 
-        if flush_up_bars.empty or flush_up_bars.iloc[0]["Low"] > mid_point:
-            # print("❌ first flush up started after mid point, or didn't happen at all")
-            continue
-        # print(
-        #     f"✅ first flush up started at {flush_up_bars.iloc[0]['Low']} before mid point {mid_point}"
-        # )
-
-        # Find the date which broke above bull trap
-        break_above_bull_trap = range_data.index[
-            range_data["High"] > previous_bull_trap[1]
-        ]
-        if break_above_bull_trap.empty:
-            # print(
-            #     f"❌ no break above bull trap {previous_bull_trap} before the price reaches stopping point"
-            # )
-            continue
-        date_which_broke_above_bull_trap = break_above_bull_trap[0]
-        # print(
-        #     f"✅ date_which_broke_above_bull_trap: {date_which_broke_above_bull_trap}"
-        # )
-
-        total_bar_count = len(range_data)
-        flush_up_count = flush_up_mask.sum()
-
-        if total_bar_count < 5 or flush_up_count / total_bar_count < 0.3:
-            # print(
-            #     f"❌ less than 5 bars or not majority flush up, flush up bars: {flush_up_count}, total bars: {total_bar_count}"
-            # )
-            continue
-        # print(
-        #     f"✅ > 5 bars and majority flush up, flush up bars: {flush_up_count}, total bars: {total_bar_count}"
-        # )
-
-        # Check 6 bars after break above bull trap
-        post_break_data = data.loc[date_which_broke_above_bull_trap:].head(6)
-
-        for i, (date, row) in enumerate(post_break_data.iterrows(), 1):
-            if row["Close"] < previous_bull_trap[1] and (
-                row["Open"] - row["Close"] > 0.5 * (row["High"] - row["Low"])
-                or (
-                    row["Open"] < row["High"] - 4 / 5 * (row["High"] - row["Low"])
-                    and row["Close"] < row["High"] - 4 / 5 * (row["High"] - row["Low"])
-                )
-            ):
-                # print(
-                #     f"🚀 {date} closed at {row['Close']}; below bull trap. All Conditions met!"
-                # )
-                bear_raging_dates.append(date)
-                break
-            # else:
-                # print(f"❌ check bar {i}, no bearish bar closing below stop loss zone")
-
-    return bear_raging_dates
 
+def get_apex_uptrend_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    sma_50 = pd.Series(cache.sma(50), index=cache.index)
+    sma_200 = pd.Series(cache.sma(200), index=cache.index)
 
-# @st.cache_data(ttl="1d")
-def get_apex_uptrend_dates(data):
-    data["SMA_50"] = data["Close"].rolling(window=50).mean()
-    data["SMA_200"] = data["Close"].rolling(window=200).mean()
-
-    agg_data = get_2day_aggregated_data(data)
+    agg_data = cache.bars(2)
 
     high_inflexion_points = []
     low_inflexion_points = []
@@ -400,14 +387,14 @@ def get_apex_uptrend_dates(data):
         ):
             # Check if all points are above sma50 and sma200
             if (
-                (point_a["Low"] < data.loc[point_a.name, "SMA_50"])
-                or (point_a["Low"] < data.loc[point_a.name, "SMA_200"])
-                or (point_b["Low"] < data.loc[point_b.name, "SMA_50"])
-                or (point_b["Low"] < data.loc[point_b.name, "SMA_200"])
-                or (point_c["Low"] < data.loc[point_c.name, "SMA_50"])
-                or (point_c["Low"] < data.loc[point_c.name, "SMA_200"])
-                or (point_d["Low"] < data.loc[point_d.name, "SMA_50"])
-                or (point_d["Low"] < data.loc[point_d.name, "SMA_200"])
+                (point_a["Low"] < sma_50[point_a.name])
+                or (point_a["Low"] < sma_200[point_a.name])
+                or (point_b["Low"] < sma_50[point_b.name])
+                or (point_b["Low"] < sma_200[point_b.name])
+                or (point_c["Low"] < sma_50[point_c.name])
+                or (point_c["Low"] < sma_200[point_c.name])
+                or (point_d["Low"] < sma_50[point_d.name])
+                or (point_d["Low"] < sma_200[point_d.name])
             ):
                 print("❌exit because below sma")
                 continue
@@ -457,16 +444,16 @@ def get_apex_uptrend_dates(data):
         ):
             # Check if all points are above sma50 and sma200
             if (
-                (point_a["Low"] < data.loc[point_a.name, "SMA_50"])
-                or (point_a["Low"] < data.loc[point_a.name, "SMA_200"])
-                or (point_b["Low"] < data.loc[point_b.name, "SMA_50"])
-                or (point_b["Low"] < data.loc[point_b.name, "SMA_200"])
-                or (point_c["Low"] < data.loc[point_c.name, "SMA_50"])
-                or (point_c["Low"] < data.loc[point_c.name, "SMA_200"])
-                or (point_d["Low"] < data.loc[point_d.name, "SMA_50"])
-                or (point_d["Low"] < data.loc[point_d.name, "SMA_200"])
-                or (point_e["Low"] < data.loc[point_e.name, "SMA_50"])
-                or (point_e["Low"] < data.loc[point_e.name, "SMA_200"])
+                (point_a["Low"] < sma_50[point_a.name])
+                or (point_a["Low"] < sma_200[point_a.name])
+                or (point_b["Low"] < sma_50[point_b.name])
+                or (point_b["Low"] < sma_200[point_b.name])
+                or (point_c["Low"] < sma_50[point_c.name])
+                or (point_c["Low"] < sma_200[point_c.name])
+                or (point_d["Low"] < sma_50[point_d.name])
+                or (point_d["Low"] < sma_200[point_d.name])
+                or (point_e["Low"] < sma_50[point_e.name])
+                or (point_e["Low"] < sma_200[point_e.name])
             ):
                 continue
             # add all the dateindex of 4 inflexion points abcd
@@ -486,10 +473,12 @@ def get_apex_uptrend_dates(data):
 
 
 # @st.cache_data(ttl="1d")
-def get_apex_downtrend_dates(data):
-    data["SMA_50"] = data["Close"].rolling(window=50).mean()
+def get_apex_downtrend_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    sma_50 = pd.Series(cache.sma(50), index=cache.index)
 
-    agg_data = get_2day_aggregated_data(data)
+    agg_data = cache.bars(2)
 
     high_inflexion_points = []
     low_inflexion_points = []
@@ -530,10 +519,10 @@ def get_apex_downtrend_dates(data):
         ):
             # Check if all points are below sma50
             if (
-                (point_a["Low"] > data.loc[point_a.name, "SMA_50"])
-                or (point_b["Low"] > data.loc[point_b.name, "SMA_50"])
-                or (point_c["Low"] > data.loc[point_c.name, "SMA_50"])
-                or (point_d["Low"] > data.loc[point_d.name, "SMA_50"])
+                (point_a["Low"] > sma_50[point_a.name])
+                or (point_b["Low"] > sma_50[point_b.name])
+                or (point_c["Low"] > sma_50[point_c.name])
+                or (point_d["Low"] > sma_50[point_d.name])
             ):
                 continue
 
@@ -579,11 +568,11 @@ def get_apex_downtrend_dates(data):
         ):
             # Check if all points are below sma50
             if (
-                (point_a["Low"] > data.loc[point_a.name, "SMA_50"])
-                or (point_b["Low"] > data.loc[point_b.name, "SMA_50"])
-                or (point_c["Low"] > data.loc[point_c.name, "SMA_50"])
-                or (point_d["Low"] > data.loc[point_d.name, "SMA_50"])
-                or (point_e["Low"] > data.loc[point_e.name, "SMA_50"])
+                (point_a["Low"] > sma_50[point_a.name])
+                or (point_b["Low"] > sma_50[point_b.name])
+                or (point_c["Low"] > sma_50[point_c.name])
+                or (point_d["Low"] > sma_50[point_d.name])
+                or (point_e["Low"] > sma_50[point_e.name])
             ):
                 continue
             # add all the dateindex of 4 inflexion points abcd
@@ -601,476 +590,245 @@ def get_apex_downtrend_dates(data):
     return downtrend_dates
 
 
-def get_apex_bull_appear_dates(data):
-    aggregated_data = get_2day_aggregated_data(data)
-
+# The appear scans over arrays. A kangaroo wallaby is a bar (the wallaby) inside the range of the bar
+# before it (the kangaroo). For bull appear, with the 200 SMA not sloping down over the 5 bars after the
+# kangaroo and the kangaroo low above the 50 SMA:
+#   - within 4 bars of the wallaby, one breaks below the kangaroo before any breaks above it,
+#   - from that bar on, a bullish bar closes back inside the kangaroo range (its date is the signal),
+#   - one of the bars from K-1 to K+4 crosses a bear trap valid over the year before K-1, or one from K
+#     onwards touches the 20, 50 or 200 SMA.
+# Bear appear wants the 20 SMA not rising, the kangaroo high below the 20 SMA, a break above the kangaroo
+# before any bar holds a higher low, a bearish close back in range and a valid bull trap crossed.
+# The slope and SMA conditions are whole-array comparisons, the 4 bars after every wallaby are one
+# look-ahead matrix, and the valid traps are only looked up for the few wallabies left after that.
+def scan_appear(cache, kind):
+    aggregated_data = cache.bars(2)
     if "Close" not in aggregated_data.columns:
-        # print("The 'Close' column is missing from the data. Skipping...")
         return None
-    aggregated_data["SMA_20"] = aggregated_data["Close"].rolling(window=20).mean()
-    aggregated_data["SMA_50"] = aggregated_data["Close"].rolling(window=50).mean()
-    aggregated_data["SMA_200"] = aggregated_data["Close"].rolling(window=200).mean()
-
-    # Find dates where the high of the current day is lower than the high of the previous day = Kangaroo wallaby formation
-    condition = (aggregated_data["High"] < aggregated_data["High"].shift(1)) & (
-        aggregated_data["Low"] > aggregated_data["Low"].shift(1)
-    )
-    wallaby_dates = aggregated_data.index[condition]
-
-    bull_appear_dates = []
-    potential_bear_traps = get_low_inflexion_points(aggregated_data)
-
-    for date in wallaby_dates:
-        # print(f"======{date}======")
-        wallaby_pos = aggregated_data.index.get_loc(date)
-        kangaroo_pos = wallaby_pos - 1
-
-        # Get date index 1 year before date, approximately 126 indexes before
-        start_index = max(0, wallaby_pos - 126)
-        end_index = kangaroo_pos - 1
-
-        active_bear_traps = find_bear_traps(
-            potential_bear_traps,
-            aggregated_data.index[start_index],
-            aggregated_data.index[end_index],
+    opens, highs, lows, closes = (cache.column(name, 2) for name in ("Open", "High", "Low", "Close"))
+    sma_20 = cache.sma(20, timeframe=2)
+    sma_50 = cache.sma(50, timeframe=2)
+    sma_200 = cache.sma(200, timeframe=2)
+    n = len(aggregated_data)
+    bar_range = highs - lows
+
+    # the 5 bar slope is only checked where K+5 exists, missing SMAs compare as False and never skip
+    if kind == "bull":
+        slope = sma_200
+        sloping_wrong = np.zeros(n, dtype=bool)
+        sloping_wrong[:-5] = slope[:-5] > slope[5:]
+        near_sma = lows > sma_50
+        reversal = ((opens > lows + 4 / 5 * bar_range) & (closes > lows + 4 / 5 * bar_range)) | (
+            closes - opens > 0.5 * bar_range
         )
+    else:
+        slope = sma_20
+        sloping_wrong = np.zeros(n, dtype=bool)
+        sloping_wrong[:-5] = slope[:-5] < slope[5:]
+        near_sma = highs < sma_20
+        reversal = ((opens < lows + 1 / 5 * bar_range) & (closes < lows + 1 / 5 * bar_range)) | (
+            opens - closes > 0.5 * bar_range
+        )
+    touches_sma = (
+        ((lows <= sma_20) & (sma_20 <= highs))
+        | ((lows <= sma_50) & (sma_50 <= highs))
+        | ((lows <= sma_200) & (sma_200 <= highs))
+    )
 
-        any_bar_went_below_kangaroo = False
-        bullish_bar_went_back_up_to_range = False
-
-        # Condition 1: 200 SMA should slope upwards
-        if (
-            kangaroo_pos + 5 < len(aggregated_data)
-            and aggregated_data["SMA_200"].iloc[kangaroo_pos]
-            > aggregated_data["SMA_200"].iloc[kangaroo_pos + 5]
-        ):
-            # print("Condition 1 not met: 200 SMA should slope upward")
+    wallaby = (highs < previous(highs)) & (lows > previous(lows))
+    kangaroo = np.flatnonzero(wallaby) - 1
+    kangaroo = kangaroo[~sloping_wrong[kangaroo] & near_sma[kangaroo]]
+    if len(kangaroo) == 0:
+        return pd.DatetimeIndex([])
+
+    # rows are wallabies, columns the 4 bars after them, past the last bar every comparison is False
+    def look_ahead(values, fill=np.nan):
+        padded = np.concatenate((values, np.full(4, fill, dtype=values.dtype)))
+        return padded[kangaroo[:, None] + np.arange(2, 6)]
+
+    kangaroo_high = highs[kangaroo][:, None]
+    kangaroo_low = lows[kangaroo][:, None]
+    if kind == "bull":
+        broke_out = look_ahead(lows) < kangaroo_low
+        exited = look_ahead(highs) > kangaroo_high
+    else:
+        broke_out = look_ahead(highs) > kangaroo_high
+        exited = look_ahead(lows) > kangaroo_low
+    # an exit stops the look-ahead unless a bar broke out before, the same bar breaking out is too late
+    first_break = np.where(broke_out.any(axis=1), broke_out.argmax(axis=1), 4)
+    first_exit = np.where(exited.any(axis=1), exited.argmax(axis=1), 4)
+    look_ahead_closes = look_ahead(closes)
+    back_in_range = (
+        (np.arange(4) >= first_break[:, None])
+        & (kangaroo_low <= look_ahead_closes)
+        & (look_ahead_closes <= kangaroo_high)
+        & look_ahead(reversal, False)
+    )
+    matched = (first_break < first_exit) & back_in_range.any(axis=1)
+    signal_rows = kangaroo + 2 + back_in_range.argmax(axis=1)
+
+    trap_index = cache.bear_trap_index() if kind == "bull" else cache.bull_trap_index()
+    find_traps = find_bear_traps if kind == "bull" else find_bull_traps
+    appear_dates = []
+    for kangaroo_pos, signal_row in zip(kangaroo[matched].tolist(), signal_rows[matched].tolist()):
+        # K onwards touching an SMA is enough, else a valid trap has to be crossed from K-1
+        if touches_sma[kangaroo_pos : kangaroo_pos + 5].any():
+            appear_dates.append(aggregated_data.index[signal_row])
             continue
-        # else:
-        #     print("Condition 1 met: 200 SMA slopes upwards")
-
-        # Condition 2: Should be above 50 sma (roughly)
-        if (
-            aggregated_data["Low"].iloc[kangaroo_pos]
-            > aggregated_data["SMA_50"].iloc[kangaroo_pos]
-        ):
-            pass
-            # print(
-            #     f"Condition 2 met: K Low is above 50 sma: {aggregated_data['Low'].iloc[kangaroo_pos]} {aggregated_data['SMA_50'].iloc[kangaroo_pos]}"
-            # )
-        else:
-            # print(
-            #     f"Condition 2 not met: K Low should be above 50 sma {aggregated_data['Low'].iloc[kangaroo_pos]} {aggregated_data['SMA_50'].iloc[kangaroo_pos]}"
-            # )
+        start_index = max(0, kangaroo_pos - 125)
+        end_index = kangaroo_pos - 1
+        active_traps = find_traps(trap_index, aggregated_data.index[start_index], aggregated_data.index[end_index])
+        if not active_traps:
             continue
+        trap_values = np.array([value for _, value in active_traps])
+        bars = slice(end_index, end_index + 6)
+        crossed = (trap_values > lows[bars][:, None]) & (trap_values < highs[bars][:, None])
+        if crossed.any():
+            appear_dates.append(aggregated_data.index[signal_row])
 
-        # Check the next 4 trading dates from wallaby date
-        for i in range(1, 5):
-            # print(f"Checking {i} days after wallaby date")
-            target_pos = wallaby_pos + i
-            if target_pos >= len(aggregated_data):
-                break
+    return pd.DatetimeIndex(appear_dates)
 
-            curr_data = aggregated_data.iloc[target_pos]
-            curr_date = aggregated_data.index[target_pos]
 
-            # if high is higher than kangaroo, exit
-            if (
-                not any_bar_went_below_kangaroo
-                and curr_data["High"] > aggregated_data.iloc[kangaroo_pos]["High"]
-            ):
-                # print("Exiting because high is higher than kangaroo")
-                break
+def get_apex_bull_appear_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return scan_appear(cache, "bull")
 
-            # Condition 2: Low below the low of the kangaroo wallaby,
-            if (
-                not any_bar_went_below_kangaroo
-                and curr_data["Low"] < aggregated_data.iloc[kangaroo_pos]["Low"]
-            ):
-                any_bar_went_below_kangaroo = True
-                # print("Condition 3 met: broke below kangaroo lows")
 
-            # Condition 3: must have one of 3 bullish bars (after going out of K range), close between low and high of kangaroo wallaby
-            if (
-                any_bar_went_below_kangaroo
-                and not bullish_bar_went_back_up_to_range
-                and aggregated_data.iloc[kangaroo_pos]["Low"]
-                <= curr_data["Close"]
-                <= aggregated_data.iloc[kangaroo_pos]["High"]
-            ):
-                if (
-                    curr_data["Open"]
-                    > curr_data["Low"] + 4 / 5 * (curr_data["High"] - curr_data["Low"])
-                    and curr_data["Close"]
-                    > curr_data["Low"] + 4 / 5 * (curr_data["High"] - curr_data["Low"])
-                ) or curr_data["Close"] - curr_data["Open"] > 0.5 * (
-                    curr_data["High"] - curr_data["Low"]
-                ):
-                    bullish_bar_went_back_up_to_range = True
-                    # print("Condition 4 met: bullish bar close between low and high ")
-                    break
-
-        if not any_bar_went_below_kangaroo or not bullish_bar_went_back_up_to_range:
-            continue
+def get_apex_bear_appear_dates(data, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return scan_appear(cache, "bear")
 
-        # Condition 4: active bear trap must be taken between K-1 and K+5
-        # OR if K-K+5 touches 20sma, 50 sma or 200 sma from below
-        for i in range(0, 6):
-            curr_pos = end_index + i
-            if curr_pos >= len(aggregated_data):
-                break
-            curr_data = aggregated_data.iloc[curr_pos]
-            # print(f"Trying to find bear trap or touching of sma for {curr_data.name}")
-            if any(
-                trap[1] > curr_data["Low"] and trap[1] < curr_data["High"]
-                for trap in active_bear_traps
-            ):
-                pass
-                # print(f"Condition 5a met: bear trap met!, {active_bear_traps}")
-
-            # else if touches sma20, sma50 or sma200
-            elif (
-                i > 0  # only valid if K onwards touches sma (Try between low and close)
-                and (
-                    curr_data["Low"]
-                    <= aggregated_data["SMA_20"].iloc[curr_pos]
-                    <= curr_data["High"]
-                    or curr_data["Low"]
-                    <= aggregated_data["SMA_50"].iloc[curr_pos]
-                    <= curr_data["High"]
-                    or curr_data["Low"]
-                    <= aggregated_data["SMA_200"].iloc[curr_pos]
-                    <= curr_data["High"]
-                )
-            ):
-                pass
-                # print(
-                #     f"Condition 5b met: touches SMA 20, 50 or 200: {curr_data['Low']}, {curr_data['High']}"
-                # )
-                # print(f"SMAs are {aggregated_data["SMA_20"].iloc[curr_pos]}, {aggregated_data["SMA_50"].iloc[curr_pos]}, {aggregated_data["SMA_200"].iloc[curr_pos]}")
-            else:
-                continue
 
-            bull_appear_dates.append(curr_date)
+# Signal functions take a FeatureCache and return a boolean array aligned with cache.index. The
+# get_*_dates wrappers turn that into the matching dates without writing anything into `data`.
+def golden_cross_signal(cache, short_window=50, long_window=200):
+    short_sma, long_sma = cache.sma(short_window), cache.sma(long_window)
+    return (short_sma > long_sma) & (previous(short_sma) <= previous(long_sma))
 
-            # print(
-            #     "✅ Wallaby date: "
-            #     + str(date)
-            #     + "; Bull appear date: "
-            #     + str(curr_date)
-            # )
-            break
-
-    return pd.DatetimeIndex(bull_appear_dates)
-
-
-def get_apex_bear_appear_dates(data):
-    aggregated_data = get_2day_aggregated_data(data)
 
-    if "Close" not in aggregated_data.columns:
-        # print("The 'Close' column is missing from the data. Skipping...")
-        return None
-    aggregated_data["SMA_20"] = aggregated_data["Close"].rolling(window=20).mean()
-    aggregated_data["SMA_50"] = aggregated_data["Close"].rolling(window=50).mean()
-    aggregated_data["SMA_200"] = aggregated_data["Close"].rolling(window=200).mean()
-
-    # Find dates where the high of the current day is lower than the high of the previous day = Kangaroo wallaby formation
-    condition = (aggregated_data["High"] < aggregated_data["High"].shift(1)) & (
-        aggregated_data["Low"] > aggregated_data["Low"].shift(1)
-    )
-    wallaby_dates = aggregated_data.index[condition]
+def death_cross_signal(cache, short_window=50, long_window=200):
+    short_sma, long_sma = cache.sma(short_window), cache.sma(long_window)
+    return (short_sma < long_sma) & (previous(short_sma) >= previous(long_sma))
 
-    bear_appear_dates = []
-    potential_bull_traps = get_high_inflexion_points(aggregated_data)
 
-    for date in wallaby_dates:
-        # print(f"======{date}======")
-        wallaby_pos = aggregated_data.index.get_loc(date)
-        kangaroo_pos = wallaby_pos - 1
+def rsi_overbought_signal(cache, threshold=70):
+    return cache.rsi() > threshold
 
-        # Get date index 1 year before date, approximately 126 indexes before
-        start_index = max(0, wallaby_pos - 126)
-        end_index = kangaroo_pos - 1
 
-        active_bull_traps = find_bull_traps(
-            potential_bull_traps,
-            aggregated_data.index[start_index],
-            aggregated_data.index[end_index],
-        )
+def rsi_oversold_signal(cache, threshold=30):
+    return cache.rsi() < threshold
 
-        any_bar_went_above_kangaroo = False
-        bearish_bar_went_back_down_to_range = False
 
-        # Condition 1: 20 SMA should slope downwards??
-        if (
-            kangaroo_pos + 5 < len(aggregated_data)
-            and aggregated_data["SMA_20"].iloc[kangaroo_pos]
-            < aggregated_data["SMA_20"].iloc[kangaroo_pos + 5]
-        ):
-            # print("Condition 1 not met: 20 SMA should slope downwards")
-            continue
-        # else:
-        # print("Condition 1 met: 20 SMA slopes upwards")
+def macd_bullish_signal(cache, short_window=12, long_window=26, signal_window=9):
+    macd, signal_line = cache.macd(short_window, long_window, signal_window)
+    return (macd > signal_line) & (previous(macd) <= previous(signal_line))
 
-        # Condition 2: Should be below 20 sma (roughly)
-        if (
-            aggregated_data["High"].iloc[kangaroo_pos]
-            < aggregated_data["SMA_20"].iloc[kangaroo_pos]
-        ):
-            pass
-            # print(
-            # f"Condition 2 met: K High is below 50 sma: {aggregated_data['Low'].iloc[kangaroo_pos]} {aggregated_data['SMA_50'].iloc[kangaroo_pos]}"
-            # )
-        else:
-            # print(
-            # f"Condition 2 not met: K High should be below 50 sma {aggregated_data['Low'].iloc[kangaroo_pos]} {aggregated_data['SMA_50'].iloc[kangaroo_pos]}"
-            # )
-            continue
 
-        # Check the next 4 trading dates from wallaby date
-        for i in range(1, 5):
-            # print(f"Checking {i} days after wallaby date")
-            target_pos = wallaby_pos + i
-            if target_pos >= len(aggregated_data):
-                break
+def macd_bearish_signal(cache, short_window=12, long_window=26, signal_window=9):
+    macd, signal_line = cache.macd(short_window, long_window, signal_window)
+    return (macd < signal_line) & (previous(macd) >= previous(signal_line))
 
-            curr_data = aggregated_data.iloc[target_pos]
-            curr_date = aggregated_data.index[target_pos]
 
-            # if low is lower than kangaroo, exit
-            if (
-                not any_bar_went_above_kangaroo
-                and curr_data["Low"] > aggregated_data.iloc[kangaroo_pos]["Low"]
-            ):
-                # print("Exiting because low is lower than kangaroo")
-                break
+def bollinger_bands(cache, window=20, num_std_dev=2):
+    middle_band = cache.sma(window)
+    upper_band = middle_band + num_std_dev * cache.std(window)
+    lower_band = middle_band - num_std_dev * cache.std(window)
+    return middle_band, upper_band, lower_band
 
-            # Condition 2: High above the high of the kangaroo wallaby,
-            if (
-                not any_bar_went_above_kangaroo
-                and curr_data["High"] > aggregated_data.iloc[kangaroo_pos]["High"]
-            ):
-                any_bar_went_above_kangaroo = True
-                # print("Condition 3 met: broke above kangaroo highs")
 
-            # Condition 3: must have one of 3 bearish bars (after going out of K range), close between low and high of kangaroo wallaby
-            if (
-                any_bar_went_above_kangaroo
-                and not bearish_bar_went_back_down_to_range
-                and aggregated_data.iloc[kangaroo_pos]["Low"]
-                <= curr_data["Close"]
-                <= aggregated_data.iloc[kangaroo_pos]["High"]
-            ):
-                if (
-                    curr_data["Open"]
-                    < curr_data["Low"] + 1 / 5 * (curr_data["High"] - curr_data["Low"])
-                    and curr_data["Close"]
-                    < curr_data["Low"] + 1 / 5 * (curr_data["High"] - curr_data["Low"])
-                ) or curr_data["Open"] - curr_data["Close"] > 0.5 * (
-                    curr_data["High"] - curr_data["Low"]
-                ):
-                    bearish_bar_went_back_down_to_range = True
-                    # print("Condition 4 met: bullish bar close between low and high ")
-                    break
-
-        if not any_bar_went_above_kangaroo or not bearish_bar_went_back_down_to_range:
-            continue
+def bollinger_band_squeeze_signal(cache, window=20, num_std_dev=2):
+    middle_band, upper_band, lower_band = bollinger_bands(cache, window, num_std_dev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (upper_band - lower_band) / middle_band <= 0.05
 
-        # Condition 4: active bear trap must be taken between K-1 and K+5
-        # OR if K-K+5 touches 20sma, 50 sma or 200 sma from below
-        for i in range(0, 6):
-            curr_pos = end_index + i
-            if curr_pos >= len(aggregated_data):
-                break
-            curr_data = aggregated_data.iloc[curr_pos]
-            # print(f"Trying to find bear trap or touching of sma for {curr_data.name}")
-            if any(
-                trap[1] > curr_data["Low"] and trap[1] < curr_data["High"]
-                for trap in active_bull_traps
-            ):
-                pass
-                # print(f"Condition 5a met: bear trap met!, {active_bull_traps}")
-
-            # else if touches sma20, sma50 or sma200
-            elif (
-                i > 0  # only valid if K onwards touches sma (Try between low and close)
-                and (
-                    curr_data["Low"]
-                    <= aggregated_data["SMA_20"].iloc[curr_pos]
-                    <= curr_data["High"]
-                    or curr_data["Low"]
-                    <= aggregated_data["SMA_50"].iloc[curr_pos]
-                    <= curr_data["High"]
-                    or curr_data["Low"]
-                    <= aggregated_data["SMA_200"].iloc[curr_pos]
-                    <= curr_data["High"]
-                )
-            ):
-                pass
-                # print(
-                #     f"Condition 5b met: touches SMA 20, 50 or 200: {curr_data['Low']}, {curr_data['High']}"
-                # )
-                # print(f"SMAs are {aggregated_data["SMA_20"].iloc[curr_pos]}, {aggregated_data["SMA_50"].iloc[curr_pos]}, {aggregated_data["SMA_200"].iloc[curr_pos]}")
-            else:
-                continue
 
-            bear_appear_dates.append(curr_date)
+def bollinger_band_expansion_signal(cache, window=20, num_std_dev=2):
+    middle_band, upper_band, lower_band = bollinger_bands(cache, window, num_std_dev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (upper_band - lower_band) / middle_band >= 0.1
 
-            # print(
-            #     "✅ Wallaby date: "
-            #     + str(date)
-            #     + "; Bear appear date: "
-            #     + str(curr_date)
-            # )
-            break
 
-    return pd.DatetimeIndex(bear_appear_dates)
+def bollinger_band_breakout_signal(cache, window=20, num_std_dev=2):
+    _, upper_band, _ = bollinger_bands(cache, window, num_std_dev)
+    return cache.column("Close") > upper_band
 
 
-def get_golden_cross_sma_dates(data, short_window=50, long_window=200):
-    data[f"SMA_{short_window}"] = data["Close"].rolling(window=short_window).mean()
-    data[f"SMA_{long_window}"] = data["Close"].rolling(window=long_window).mean()
-    data[f"Prev_SMA_{short_window}"] = data[f"SMA_{short_window}"].shift(1)
-    data[f"Prev_SMA_{long_window}"] = data[f"SMA_{long_window}"].shift(1)
+def bollinger_band_pullback_signal(cache, window=20, num_std_dev=2):
+    _, _, lower_band = bollinger_bands(cache, window, num_std_dev)
+    return cache.column("Close") < lower_band
 
-    golden_cross = (data[f"SMA_{short_window}"] > data[f"SMA_{long_window}"]) & (
-        data[f"Prev_SMA_{short_window}"] <= data[f"Prev_SMA_{long_window}"]
-    )
 
-    golden_cross_dates = golden_cross[golden_cross].index
-    return golden_cross_dates
+def volume_spike_signal(cache, window=20, num_std_dev=2):
+    volume_ma = cache.sma(window, column="Volume")
+    volume_ma_std = cache.std(window, column="Volume")
+    return cache.column("Volume") > volume_ma + num_std_dev * volume_ma_std
 
 
-def get_death_cross_sma_dates(data, short_window=50, long_window=200):
-    data[f"SMA_{short_window}"] = data["Close"].rolling(window=short_window).mean()
-    data[f"SMA_{long_window}"] = data["Close"].rolling(window=long_window).mean()
-    data[f"Prev_SMA_{short_window}"] = data[f"SMA_{short_window}"].shift(1)
-    data[f"Prev_SMA_{long_window}"] = data[f"SMA_{long_window}"].shift(1)
+def get_golden_cross_sma_dates(data, short_window=50, long_window=200, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[golden_cross_signal(cache, short_window, long_window)]
 
-    death_cross = (data[f"SMA_{short_window}"] < data[f"SMA_{long_window}"]) & (
-        data[f"Prev_SMA_{short_window}"] >= data[f"Prev_SMA_{long_window}"]
-    )
-    death_cross_dates = death_cross[death_cross].index
 
-    return death_cross_dates
+def get_death_cross_sma_dates(data, short_window=50, long_window=200, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[death_cross_signal(cache, short_window, long_window)]
 
 
-def get_rsi_overbought_dates(data, threshold=70):
-    delta = data["Close"].diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=13, adjust=False).mean()
-    avg_loss = loss.ewm(com=13, adjust=False).mean()
-    rs = avg_gain / avg_loss
-    data["RSI"] = 100 - (100 / (1 + rs))
-    if data["RSI"].empty:
+def get_rsi_overbought_dates(data, threshold=70, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    if len(cache.rsi()) == 0:
         return False
-    overbought = data["RSI"] > threshold
-    overbought_dates = overbought[overbought].index
+    return cache.index[rsi_overbought_signal(cache, threshold)]
 
-    return overbought_dates
 
+def get_rsi_oversold_dates(data, threshold=30, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[rsi_oversold_signal(cache, threshold)]
 
-def get_rsi_oversold_dates(data, threshold=30):
-    delta = data["Close"].diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=13, adjust=False).mean()
-    avg_loss = loss.ewm(com=13, adjust=False).mean()
-    rs = avg_gain / avg_loss
-    data["RSI"] = 100 - (100 / (1 + rs))
 
-    oversold = data["RSI"] < threshold
-    oversold_dates = oversold[oversold].index
-    return oversold_dates
+def get_macd_bullish_dates(data, short_window=12, long_window=26, signal_window=9, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[macd_bullish_signal(cache, short_window, long_window, signal_window)]
 
 
-def get_macd_bullish_dates(data, short_window=12, long_window=26, signal_window=9):
-    data["Short_EMA"] = data["Close"].ewm(span=short_window, adjust=False).mean()
-    data["Long_EMA"] = data["Close"].ewm(span=long_window, adjust=False).mean()
-    data["MACD"] = data["Short_EMA"] - data["Long_EMA"]
-    data["Signal_Line"] = data["MACD"].ewm(span=signal_window, adjust=False).mean()
+def get_macd_bearish_dates(data, short_window=12, long_window=26, signal_window=9, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[macd_bearish_signal(cache, short_window, long_window, signal_window)]
 
-    bullish = (data["MACD"] > data["Signal_Line"]) & (
-        data["MACD"].shift(1) <= data["Signal_Line"].shift(1)
-    )
-    bullish_dates = bullish[bullish].index
-    return bullish_dates
 
+def get_bollinger_band_squeeze_dates(data, window=20, num_std_dev=2, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[bollinger_band_squeeze_signal(cache, window, num_std_dev)]
 
-def get_macd_bearish_dates(data, short_window=12, long_window=26, signal_window=9):
-    data["Short_EMA"] = data["Close"].ewm(span=short_window, adjust=False).mean()
-    data["Long_EMA"] = data["Close"].ewm(span=long_window, adjust=False).mean()
-    data["MACD"] = data["Short_EMA"] - data["Long_EMA"]
-    data["Signal_Line"] = data["MACD"].ewm(span=signal_window, adjust=False).mean()
 
-    bearish = (data["MACD"] < data["Signal_Line"]) & (
-        data["MACD"].shift(1) >= data["Signal_Line"].shift(1)
-    )
-    bearish_dates = bearish[bearish].index
-    return bearish_dates
+def get_bollinger_band_expansion_dates(data, window=20, num_std_dev=2, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[bollinger_band_expansion_signal(cache, window, num_std_dev)]
 
 
-def get_bollinger_band_squeeze_dates(data, window=20, num_std_dev=2):
-    data["Middle_Band"] = data["Close"].rolling(window=window).mean()
-    data["Upper_Band"] = (
-        data["Middle_Band"] + num_std_dev * data["Close"].rolling(window=window).std()
-    )
-    data["Lower_Band"] = (
-        data["Middle_Band"] - num_std_dev * data["Close"].rolling(window=window).std()
-    )
-
-    squeeze = (data["Upper_Band"] - data["Lower_Band"]) / data["Middle_Band"] <= 0.05
-    squeeze_dates = squeeze[squeeze].index
-    return squeeze_dates
-
-
-def get_bollinger_band_expansion_dates(data, window=20, num_std_dev=2):
-    data["Middle_Band"] = data["Close"].rolling(window=window).mean()
-    data["Upper_Band"] = (
-        data["Middle_Band"] + num_std_dev * data["Close"].rolling(window=window).std()
-    )
-    data["Lower_Band"] = (
-        data["Middle_Band"] - num_std_dev * data["Close"].rolling(window=window).std()
-    )
-
-    expansion = (data["Upper_Band"] - data["Lower_Band"]) / data["Middle_Band"] >= 0.1
-    expansion_dates = expansion[expansion].index
-    return expansion_dates
-
-
-def get_bollinger_band_breakout_dates(data, window=20, num_std_dev=2):
-    data["Middle_Band"] = data["Close"].rolling(window=window).mean()
-    data["Upper_Band"] = (
-        data["Middle_Band"] + num_std_dev * data["Close"].rolling(window=window).std()
-    )
-    data["Lower_Band"] = (
-        data["Middle_Band"] - num_std_dev * data["Close"].rolling(window=window).std()
-    )
-
-    breakout = data["Close"] > data["Upper_Band"]
-    breakout_dates = breakout[breakout].index
-    return breakout_dates
-
-
-def get_bollinger_band_pullback_dates(data, window=20, num_std_dev=2):
-    data["Middle_Band"] = data["Close"].rolling(window=window).mean()
-    data["Upper_Band"] = (
-        data["Middle_Band"] + num_std_dev * data["Close"].rolling(window=window).std()
-    )
-    data["Lower_Band"] = (
-        data["Middle_Band"] - num_std_dev * data["Close"].rolling(window=window).std()
-    )
+def get_bollinger_band_breakout_dates(data, window=20, num_std_dev=2, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[bollinger_band_breakout_signal(cache, window, num_std_dev)]
 
-    pullback = data["Close"] < data["Lower_Band"]
-    pullback_dates = pullback[pullback].index
-    return pullback_dates
 
+def get_bollinger_band_pullback_dates(data, window=20, num_std_dev=2, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[bollinger_band_pullback_signal(cache, window, num_std_dev)]
 
-def get_volume_spike_dates(data, window=20, num_std_dev=2):
-    data["Volume_MA"] = data["Volume"].rolling(window=window).mean()
-    data["Volume_MA_std"] = data["Volume"].rolling(window=window).std()
 
-    spike = data["Volume"] > data["Volume_MA"] + num_std_dev * data["Volume_MA_std"]
-    spike_dates = spike[spike].index
-    return spike_dates
+def get_volume_spike_dates(data, window=20, num_std_dev=2, cache=None):
+    if cache is None:
+        cache = FeatureCache(data)
+    return cache.index[volume_spike_signal(cache, window, num_std_dev)]
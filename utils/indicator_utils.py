@@ -1,140 +1,200 @@
+import numpy as np
 import pandas as pd
+import utils.metrics as metrics
 
 def get_2day_aggregated_data(data):
-    # Ensure the Date column is the index and is of datetime type
-    data.index = pd.to_datetime(data.index)
-    
-    # Split the data into separate dataframes by year
-    yearly_data = {year: df for year, df in data.groupby(data.index.year)}
-    
-    aggregated_data_list = []
-    
-    # Process each year's dataframe independently
-    for year, df in yearly_data.items():
-        # Group data into 2-day periods within each year
-        grouped = (
-            df[["High", "Low", "Open", "Close"]]
-            .rolling(window=2, min_periods=1)
-            .agg(
-                {
-                    "High": "max",
-                    "Low": "min",
-                    "Open": lambda x: x.iloc[0],
-                    "Close": lambda x: x.iloc[-1],
-                }
-            )
-        )
-        # Shift to make the aggregation align to the end of each 2-day period
-        aggregated = grouped.shift(-1).iloc[::2]
-        
-        # Append the result for the current year
-        aggregated_data_list.append(aggregated)
+    return get_n_day_aggregated_data(data, 2)
+
+
+# Aggregate every n consecutive bars of the same year into one bar dated at its first bar.
+# A year's trailing group with fewer than n bars comes out as an all-NaN row.
+def get_n_day_aggregated_data(data, n=2):
+    # Ensure the Date index is of datetime type, without modifying the caller's frame
+    index = pd.to_datetime(data.index)
+    if data.empty:
+        return pd.DataFrame()
+
+    # Groups restart at every year boundary, so number each bar by its position within its year
+    years = index.year.to_numpy()
+    year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    year_lengths = np.diff(np.r_[year_starts, len(data)])
+    position_in_year = np.arange(len(data)) - np.repeat(year_starts, year_lengths)
+    group_starts = np.flatnonzero(position_in_year % n == 0)
+    group_ends = np.r_[group_starts[1:], len(data)]
+    incomplete = group_ends - group_starts < n
+
+    columns = {
+        "High": np.fmax.reduceat(data["High"].to_numpy(dtype=float), group_starts),
+        "Low": np.fmin.reduceat(data["Low"].to_numpy(dtype=float), group_starts),
+        "Open": data["Open"].to_numpy(dtype=float)[group_starts],
+        "Close": data["Close"].to_numpy(dtype=float)[group_ends - 1],
+    }
+    if "Volume" in data.columns:
+        columns["Volume"] = np.add.reduceat(data["Volume"].to_numpy(dtype=float), group_starts)
+
+    for values in columns.values():
+        values[incomplete] = np.nan
 
-    # Combine all the yearly dataframes into one dataframe
-    if aggregated_data_list:
-        aggregated_data = pd.concat(aggregated_data_list)
-    else:
-        aggregated_data = pd.DataFrame()
-    
-    return aggregated_data
+    return pd.DataFrame(columns, index=index[group_starts])
 
 
 # pass data before kangaroo -1 inside. it cannot take the money of past bear traps
-def get_low_inflexion_points(data):
+def get_low_inflexion_points(data, as_arrays=False):
     # get all bear trap dates and values = u or v shape, where T-1 low > T low < T+1 low. Identify T
-    all_low_inflexion_points = []
-    for i in range(2, len(data) - 2):
-        if (
-            data.iloc[i - 1]["Low"] > data.iloc[i]["Low"] < data.iloc[i + 1]["Low"]
-        ) and (
-            data.iloc[i - 2]["Low"] > data.iloc[i]["Low"] < data.iloc[i + 2]["Low"]
-        ):
-            all_low_inflexion_points.append((data.index[i], data.iloc[i]["Low"]))
-    return all_low_inflexion_points
-
-
-def get_high_inflexion_points(data):
-    all_high_inflexion_points = []
-    for i in range(2, len(data) - 2):
-        if (
-            (data.iloc[i - 1]["High"] < data.iloc[i]["High"] > data.iloc[i + 1]["High"])
-            and 
-            (data.iloc[i - 2]["High"] < data.iloc[i]["High"] > data.iloc[i + 2]["High"])
-        ):
-            all_high_inflexion_points.append((data.index[i], data.iloc[i]["High"]))
-    return all_high_inflexion_points
+    positions, values = get_inflexion_positions(data.get("Low", pd.Series(dtype=float)).to_numpy(), np.greater)
+    if as_arrays:
+        return positions, values
+    return list(zip(data.index[positions], values))
+
+
+def get_high_inflexion_points(data, as_arrays=False):
+    positions, values = get_inflexion_positions(data.get("High", pd.Series(dtype=float)).to_numpy(), np.less)
+    if as_arrays:
+        return positions, values
+    return list(zip(data.index[positions], values))
+
+
+# Positions T where both neighbours on each side (T-2, T-1, T+1, T+2) compare against T with `op`,
+# e.g. np.greater for a low inflexion point: every neighbour low is greater than the low at T
+def get_inflexion_positions(values, op):
+    if len(values) < 5:
+        return np.array([], dtype=int), values[:0]
+    center = values[2:-2]
+    mask = (
+        op(values[1:-3], center)
+        & op(values[3:-1], center)
+        & op(values[:-4], center)
+        & op(values[4:], center)
+    )
+    positions = np.flatnonzero(mask) + 2
+    return positions, values[positions]
+
+
+# Sparse table of range-minimum positions over an array of keys: the minimum of any [start, end] in O(1),
+# and with a binary search on top, the first or last position of a range whose key is below a threshold
+# in O(log n). NaN keys never compare below anything, callers wanting them skipped should pass inf.
+class RangeMinimum:
+    def __init__(self, keys):
+        self.keys = keys
+
+        # table[k][i] is the first position of the minimum key in [i, i + 2**k)
+        self.table = [np.arange(len(self.keys))]
+        k = 1
+        while 1 << k <= len(self.keys):
+            prev, half = self.table[-1], 1 << (k - 1)
+            left = prev[: len(self.keys) - (1 << k) + 1]
+            right = prev[half : half + len(left)]
+            self.table.append(np.where(self.keys[right] < self.keys[left], right, left))
+            k += 1
+
+    def argmin(self, start, end):
+        k = (end - start + 1).bit_length() - 1
+        left, right = self.table[k][start], self.table[k][end - (1 << k) + 1]
+        return int(right) if self.keys[right] < self.keys[left] else int(left)
+
+    # first position in [start, end] whose key is below the threshold
+    def first_position_below(self, start, end, threshold):
+        if start > end or not self.keys[self.argmin(start, end)] < threshold:
+            return None
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys[self.argmin(start, mid)] < threshold:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    # last position in [start, end] whose key is below the threshold
+    def last_position_below(self, start, end, threshold):
+        if not self.keys[self.argmin(start, end)] < threshold:
+            return None
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.keys[self.argmin(mid, end)] < threshold:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+
+# A trap is valid (not invalidated) when no later trap up to to_date took out its price: no lower low
+# for a bear trap, no higher high for a bull trap. Valid traps therefore form a monotonic sequence, so
+# with a sparse table of range-minimum positions every query below is O(log n) instead of rebuilding
+# the list of later traps for each candidate. Build one index per ticker and reuse it.
+class TrapIndex(RangeMinimum):
+    def __init__(self, potential_traps, kind="bear"):
+        self.traps = list(potential_traps)
+        self.kind = kind
+        self.dates = np.array([pd.Timestamp(date).value for date, _ in self.traps], dtype=np.int64)
+        self.values = np.array([value for _, value in self.traps], dtype=float)
+        # bull traps are searched as bear traps over the negated highs
+        super().__init__(self.values if kind == "bear" else -self.values)
+
+    def position_range(self, from_date, to_date):
+        start = np.searchsorted(self.dates, pd.Timestamp(from_date).value, side="left")
+        end = np.searchsorted(self.dates, pd.Timestamp(to_date).value, side="right") - 1
+        return int(start), int(end)
+
+    # chronological list of valid traps in [from_date, to_date], same as the output of find_bear_traps
+    def valid_traps(self, from_date, to_date):
+        start, end = self.position_range(from_date, to_date)
+        valid_traps = []
+        while start <= end:
+            position = self.argmin(start, end)
+            valid_traps.append(self.traps[position])
+            start = position + 1
+        return valid_traps
+
+    # first valid trap in [from_date, to_date] priced within [low_price, high_price]
+    def first_valid_trap_within_price_range(self, from_date, to_date, low_price, high_price):
+        start, end = self.position_range(from_date, to_date)
+        if start > end:
+            return None
+        # a trap beyond the price boundary invalidates every earlier trap, so skip past the last one
+        boundary = low_price if self.kind == "bear" else -high_price
+        last_beyond = self.last_position_below(start, end, boundary)
+        if last_beyond is not None:
+            start = last_beyond + 1
+        if start > end:
+            return None
+        position = self.argmin(start, end)
+        if low_price <= self.values[position] <= high_price:
+            return self.traps[position]
+        return None
 
 
 def find_bear_traps(potential_traps, from_date, to_date):
-    bear_traps = []
-    # Filter bear traps up to the given date
-    potential_bear_traps_in_date_range = [(date, low) for date, low in potential_traps if from_date <= date <= to_date]
-
-    # For each bear trap, check if it has been invalidated by a lower low
-    for potential_bear_trap_date, potential_bear_trap_low in potential_bear_traps_in_date_range:
-        # Find if a lower low trap occurred after the bear trap but before the given date
-        post_bear_trap_lows = pd.Series([low for trap_date, low in potential_bear_traps_in_date_range if potential_bear_trap_date <= trap_date <= to_date])
-        if (post_bear_trap_lows < potential_bear_trap_low).any():
-            # Bear trap is invalidated
-            continue
-        bear_traps.append((potential_bear_trap_date, potential_bear_trap_low))
-
-        # Bear trap is valid
-    return bear_traps
+    with metrics.timer("trap_search"):
+        return get_trap_index(potential_traps, "bear").valid_traps(from_date, to_date)
+
 
 def find_bull_traps(potential_traps, from_date, to_date):
-    bull_traps = []
-    # Filter bull traps up to the given date
-    potential_bull_traps_in_date_range = [(date, high) for date, high in potential_traps if from_date <= date <= to_date]
-
-    # For each bull trap, check if it has been invalidated by a lower low
-    for potential_bull_trap_date, potential_bull_trap_high in potential_bull_traps_in_date_range:
-        # Find if a higher high trap occurred after the bull trap but before the given date
-        post_bull_trap_highs = pd.Series([high for trap_date, high in potential_bull_traps_in_date_range if potential_bull_trap_date <= trap_date <= to_date])
-        if (post_bull_trap_highs > potential_bull_trap_high).any():
-            # Bull trap is invalidated
-            continue
-        bull_traps.append((potential_bull_trap_date, potential_bull_trap_high))
-
-        # Bull trap is valid
-    return bull_traps
-
-
-# def find_lowest_bear_trap_within_price_range(potential_bear_traps, high_point_date, low_price, high_price):
-#     active_traps = []
-#     for trap in potential_bear_traps:
-#         trap_date, trap_low = trap
-#         if trap_date >= high_point_date or not (low_price < trap_low < high_price):
-#             continue
-        
-#         # Invalidate older traps with higher lows
-#         active_traps = [t for t in active_traps if t[1] < trap_low]
-#         active_traps.append(trap)
-    
-#     return min(active_traps, key=lambda x: x[1]) if active_traps else None
-    
+    with metrics.timer("trap_search"):
+        return get_trap_index(potential_traps, "bull").valid_traps(from_date, to_date)
+
 
+def get_trap_index(potential_traps, kind):
+    if isinstance(potential_traps, TrapIndex):
+        return potential_traps
+    return TrapIndex(potential_traps, kind)
 
 
 def find_lowest_bear_trap_within_price_range(potential_traps, up_to_date, low_price, high_price):
     # from date is 1 year before up_to_date
     from_date = up_to_date - pd.Timedelta(days=365)
-    # Filter bear traps up to the given date
-    bear_traps_up_to_date = find_bear_traps(potential_traps, from_date=from_date, to_date=up_to_date)
-    
-    for date, trap_price in bear_traps_up_to_date:
-        # Bear trap is valid
-        if low_price <= trap_price <= high_price:
-            return(date, trap_price)
-    
+    # valid bear traps only get higher over time, so the first one in range is the lowest one
+    with metrics.timer("trap_search"):
+        return get_trap_index(potential_traps, "bear").first_valid_trap_within_price_range(
+            from_date, up_to_date, low_price, high_price
+        )
+
 
 def find_highest_bull_trap_within_price_range(potential_traps, up_to_date, low_price, high_price):
     from_date = up_to_date - pd.Timedelta(days=365)
-    # Filter bull traps up to the given date
-    bull_traps_up_to_date = find_bull_traps(potential_traps, from_date=from_date, to_date=up_to_date)
-    
     # ordered from highest to lowest, so the first one will be the highest one and we can return it
-    for date, trap_price in bull_traps_up_to_date:
-        # Bull trap is valid
-        if low_price <= trap_price <= high_price:
-            return(date, trap_price)
+    with metrics.timer("trap_search"):
+        return get_trap_index(potential_traps, "bull").first_valid_trap_within_price_range(
+            from_date, up_to_date, low_price, high_price
+        )
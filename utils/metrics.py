@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+# One JSON-lines file per run date (and shard): a line per screened ticker with its stage timings, and
+# a summary line with the totals per stage and the counters when the run ends
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+
+# Stage timers of the current thread. Timers nest and every stage only keeps its own (exclusive) time,
+# so the stages of a ticker add up to its total instead of counting the aggregation inside a scan twice.
+_local = threading.local()
+
+
+def _state():
+    if not hasattr(_local, "stage_seconds"):
+        _local.stage_seconds = defaultdict(float)
+        _local.stack = []
+    return _local
+
+
+@contextmanager
+def timer(stage):
+    state = _state()
+    frame = [time.perf_counter(), 0.0]
+    state.stack.append(frame)
+    try:
+        yield
+    finally:
+        state.stack.pop()
+        elapsed = time.perf_counter() - frame[0]
+        state.stage_seconds[stage] += elapsed - frame[1]
+        if state.stack:
+            state.stack[-1][1] += elapsed
+
+
+def timed(stage, func, *args, **kwargs):
+    with timer(stage):
+        return func(*args, **kwargs)
+
+
+def reset():
+    _state().stage_seconds.clear()
+
+
+def snapshot():
+    return dict(_state().stage_seconds)
+
+
+def metrics_path(run_date, shard=None):
+    name = f"{run_date}.{shard}" if shard else run_date
+    return os.path.join(METRICS_DIR, f"{name}.jsonl")
+
+
+# Collects the per-ticker stage timings and counters of a run in the main process. Appends, so a resumed
+# run adds to the file of the interrupted one.
+class MetricsLog:
+    def __init__(self, path):
+        self.path = path
+        self.stage_seconds = defaultdict(list)
+        self.counters = defaultdict(int)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, entry):
+        self.file.write(json.dumps({"time": round(time.time(), 3), **entry}) + "\n")
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    # statuses: indicator -> what happened to it (written, unchanged, no_signals, failed)
+    def record_ticker(self, ticker, stages, statuses):
+        for stage, seconds in stages.items():
+            self.stage_seconds[stage].append(seconds)
+        for status in statuses.values():
+            self.counters[status] += 1
+        self.counters["tickers"] += 1
+        self.write({"type": "ticker", "ticker": ticker, "stages": stages, "indicators": statuses})
+
+    # upserts are batched across tickers, so they are only reported per table
+    def record_upserts(self, summary):
+        for table, table_summary in summary.items():
+            self.stage_seconds["upsert"].append(table_summary["seconds"])
+            self.counters["upsert_failures"] += table_summary["failed"]
+            self.write({"type": "upsert", "table": table, **table_summary})
+
+    def get_summary(self):
+        total = sum(sum(seconds) for seconds in self.stage_seconds.values())
+        stages = {}
+        for stage, seconds in self.stage_seconds.items():
+            values = np.array(seconds)
+            stages[stage] = {
+                "seconds": float(values.sum()),
+                "share": float(values.sum() / total * 100) if total else 0.0,
+                "count": len(values),
+                "mean_ms": float(values.mean() * 1000),
+                "p95_ms": float(np.percentile(values, 95) * 1000),
+                "max_ms": float(values.max() * 1000),
+            }
+        return {"stages": stages, "counters": dict(self.counters)}
+
+    def format_summary(self):
+        summary = self.get_summary()
+        lines = [
+            "Stage timings:",
+            f"  {'stage':<14} {'total s':>9} {'share':>7} {'count':>7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}",
+        ]
+        for stage, s in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(
+                f"  {stage:<14} {s['seconds']:>9.1f} {s['share']:>6.1f}% {s['count']:>7} "
+                f"{s['mean_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['max_ms']:>9.1f}"
+            )
+        lines.append("Counters: " + ", ".join(f"{name} {count}" for name, count in sorted(summary["counters"].items())))
+        return "\n".join(lines)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.write({"type": "summary", **self.get_summary()})
+        self.file.close()
@@ -0,0 +1,91 @@
+import queue
+import threading
+
+# Building blocks for overlapping the fetch, evaluate and write stages of a run. Every hand-off goes through
+# a bounded queue, so a fast stage blocks (backpressure) instead of piling up frames or rows in memory, and
+# the slowest stage sets the pace.
+
+_DONE = object()
+
+
+# Run an iterable in a background thread and yield its items, at most maxsize of them produced ahead.
+# Errors raised by the producer are re-raised in the consumer.
+def prefetch(iterable, maxsize):
+    items = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        # give up once the consumer has gone away, otherwise the producer would block forever on a full queue
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+# Hands items to a handler running in its own thread, through a queue of at most maxsize items.
+# put blocks while the queue is full. close (or leaving the with block) waits for the queue to drain
+# and re-raises the first error of the handler.
+class QueueWorker:
+    def __init__(self, handler, maxsize, name="queue-worker"):
+        self.handler = handler
+        self.items = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self):
+        while True:
+            item = self.items.get()
+            if item is _DONE:
+                return
+            # after a failure keep draining, so producers blocked on a full queue are released
+            if self.error is not None:
+                continue
+            try:
+                self.handler(item)
+            except BaseException as e:
+                self.error = e
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.items.put(item)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.items.put(_DONE)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
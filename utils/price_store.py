@@ -0,0 +1,152 @@
+import os
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# One parquet file per ticker, holding the full daily OHLCV history
+STORE_DIR = os.getenv("PRICE_STORE_DIR", "price_store")
+
+# Number of already stored bars re-downloaded with every tail fetch, used to detect adjusted history
+OVERLAP_BARS = 5
+
+# Counters for the current process, so a run can report how much network time the store saved. A ticker
+# is served from the store (a hit) when stored today, or by appending a downloaded tail to the stored
+# history (a tail fetch; also when the tail failed and the stored history was served as it is), and is a
+# miss when its full history had to be downloaded.
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "network_seconds": 0.0,
+    "full_download_seconds": 0.0,
+    "tail_download_seconds": 0.0,
+    "tail_fetches": 0,
+    "tail_rows": 0,
+    "full_refreshes": 0,
+    "tail_failures": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _path(ticker):
+    # tickers such as "BRK/A" are not valid file names
+    return os.path.join(STORE_DIR, f"{ticker.replace('/', '_')}.parquet")
+
+
+def last_updated(ticker):
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(path)).date()
+
+
+# history written today is considered current, anything older needs its tail fetched
+def is_fresh(ticker):
+    return last_updated(ticker) == date.today()
+
+
+def read_prices(ticker):
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        print(f"Failed to read stored prices for {ticker}: {e}")
+        return None
+
+
+def write_prices(ticker, data):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(ticker)
+    # write to a temp file first so an interrupted run never leaves a truncated file behind
+    tmp_path = f"{path}.tmp"
+    data.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Merge a freshly downloaded tail into the stored history. Returns None when the overlapping
+# bars disagree, i.e. a split or dividend re-adjusted the past and the ticker needs a full refresh
+def merge_tail(stored, tail, columns=("Open", "High", "Low", "Close")):
+    if tail is None or tail.empty:
+        return None
+    # the last stored bar may have been captured before the close, so it is not used as evidence
+    overlap = stored.index[:-1].intersection(tail.index)
+    if overlap.empty:
+        return None
+    columns = [c for c in columns if c in stored.columns and c in tail.columns]
+    if not np.allclose(
+        stored.loc[overlap, columns].to_numpy(dtype=float),
+        tail.loc[overlap, columns].to_numpy(dtype=float),
+        rtol=1e-6,
+        equal_nan=True,
+    ):
+        return None
+    return pd.concat([stored[stored.index < tail.index[0]], tail])
+
+
+# batch downloads record from worker threads
+def record_hit():
+    with _stats_lock:
+        stats["hits"] += 1
+
+
+# a full history download of count tickers
+def record_miss(network_seconds, count=1):
+    with _stats_lock:
+        stats["misses"] += count
+        stats["network_seconds"] += network_seconds
+        stats["full_download_seconds"] += network_seconds
+
+
+# the download of the tails of one or more stored tickers, counted per ticker by record_tail_fetch
+def record_tail_download(network_seconds):
+    with _stats_lock:
+        stats["network_seconds"] += network_seconds
+        stats["tail_download_seconds"] += network_seconds
+
+
+def record_tail_fetch(rows):
+    with _stats_lock:
+        stats["tail_fetches"] += 1
+        stats["tail_rows"] += rows
+
+
+def record_full_refresh():
+    with _stats_lock:
+        stats["full_refreshes"] += 1
+
+
+# the tail download failed or came back empty, the stored history was served as it is
+def record_tail_failure():
+    with _stats_lock:
+        stats["tail_failures"] += 1
+
+
+def get_stats():
+    from_store = stats["hits"] + stats["tail_fetches"] + stats["tail_failures"]
+    lookups = from_store + stats["misses"]
+    # every ticker served from the store is a full download avoided, priced at this run's average full
+    # download, less the time the tails took; unknown when nothing was downloaded in full
+    full_download_seconds = stats["full_download_seconds"] / stats["misses"] if stats["misses"] else None
+    return {
+        **stats,
+        "from_store": from_store,
+        "hit_rate": from_store / lookups * 100 if lookups else 0,
+        "estimated_seconds_saved": (
+            from_store * full_download_seconds - stats["tail_download_seconds"]
+            if full_download_seconds is not None else None
+        ),
+    }
+
+
+def format_stats():
+    s = get_stats()
+    saved = f"~{s['estimated_seconds_saved']:.1f}s" if s["estimated_seconds_saved"] is not None else "unknown time"
+    return (
+        f"Price store: {s['from_store']} tickers from the store ({s['hits']} current, {s['tail_fetches']} tail fetches "
+        f"of {s['tail_rows']} rows, {s['tail_failures']} failed tail fetches), {s['misses']} full downloads "
+        f"({s['hit_rate']:.1f}% hit rate, {s['full_refreshes']} full refreshes); "
+        f"{s['network_seconds']:.1f}s spent downloading, {saved} saved"
+    )
@@ -0,0 +1,163 @@
+import argparse
+import cProfile
+import heapq
+import json
+import os
+import pstats
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Opt-in profiling of the indicator scans. The selected indicators of every ticker run under cProfile,
+# each worker dumps the profile of its ticker, and the main process only keeps the slowest ones:
+#
+#   PROFILE_INDICATORS=bear_raging python calculate_and_save_indicator_results.py
+#   python calculate_and_save_indicator_results.py --profile bear_raging bull_raging --profile-top 20
+#
+# The kept .prof files open in pstats or snakeviz, and this module folds them into one collapsed-stack
+# file for flamegraph.pl or speedscope:
+#
+#   python -m utils.profiling profiles/2024-06-03 -o bear_raging.folded
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# "all" or comma separated indicator names, empty disables profiling
+PROFILE_INDICATORS = os.getenv("PROFILE_INDICATORS", "")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "10"))
+
+
+def parse_indicators(value, known):
+    if not value:
+        return set()
+    if value == "all":
+        return set(known)
+    indicators = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = indicators - set(known)
+    if unknown:
+        raise ValueError(f"Unknown indicators to profile: {', '.join(sorted(unknown))}")
+    return indicators
+
+
+def profile_dir(run_date, shard=None):
+    return os.path.join(PROFILE_DIR, f"{run_date}.{shard}" if shard else run_date)
+
+
+# Profiles the selected indicator calls of one ticker, in the worker screening it
+class TickerProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.seconds = 0.0
+
+    @contextmanager
+    def measure(self):
+        start_time = time.perf_counter()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.seconds += time.perf_counter() - start_time
+
+    def dump(self, directory, ticker):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{ticker.replace('/', '_')}.prof")
+        self.profile.dump_stats(path)
+        return path
+
+
+# Keeps the profiles of the `keep` slowest tickers on disk and deletes the rest as they come in
+class SlowestProfiles:
+    def __init__(self, directory, keep=PROFILE_TOP):
+        self.directory = directory
+        self.keep = keep
+        self.heap = []
+
+    def add(self, ticker, seconds, path):
+        heapq.heappush(self.heap, (seconds, ticker, path))
+        if len(self.heap) > self.keep:
+            _, _, evicted_path = heapq.heappop(self.heap)
+            os.remove(evicted_path)
+
+    def slowest(self):
+        return sorted(self.heap, reverse=True)
+
+    def write_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "index.json"), "w") as f:
+            json.dump(
+                [{"ticker": ticker, "seconds": seconds, "profile": path} for seconds, ticker, path in self.slowest()],
+                f,
+                indent=2,
+            )
+
+    def format_summary(self):
+        lines = [f"Slowest {len(self.heap)} profiled tickers (profiles in {self.directory}):"]
+        for seconds, ticker, path in self.slowest():
+            lines.append(f"  {ticker}: {seconds:.2f}s")
+        return "\n".join(lines)
+
+
+def frame_label(func):
+    filename, line, name = func
+    # collapsed stacks use ';' between frames
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+# Turn profiles into collapsed stacks ("frame;frame;frame microseconds" per line). cProfile records
+# caller -> callee edges rather than full stacks, so the time of a function reached over several paths
+# is split between them in proportion to the time each caller spent in it.
+def collapse_stacks(stats, min_seconds=1e-6):
+    entries = stats.stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, edge_tottime, edge_cumtime) in callers.items():
+            callees[caller][func] = (edge_tottime, edge_cumtime)
+
+    stacks = defaultdict(float)
+
+    def walk(func, path, tottime, cumtime):
+        path = path + (func,)
+        stacks[";".join(frame_label(f) for f in path)] += tottime
+        total_cumtime = entries[func][3]
+        if total_cumtime <= 0:
+            return
+        share = cumtime / total_cumtime
+        for callee, (edge_tottime, edge_cumtime) in callees[func].items():
+            # recursion is folded into the outermost call
+            if callee in path or edge_cumtime * share < min_seconds:
+                continue
+            walk(callee, path, edge_tottime * share, edge_cumtime * share)
+
+    for func, (_, _, tottime, cumtime, callers) in entries.items():
+        if not callers:
+            walk(func, (), tottime, cumtime)
+
+    return {stack: int(seconds * 1e6) for stack, seconds in stacks.items() if int(seconds * 1e6) > 0}
+
+
+def load_profiles(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".prof"))
+        else:
+            files.append(path)
+    if not files:
+        raise SystemExit("No .prof files found")
+    return pstats.Stats(*files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold cProfile dumps into one collapsed-stack file")
+    parser.add_argument("paths", nargs="+", help=".prof files or directories holding them")
+    parser.add_argument("-o", "--output", default=None, help="collapsed-stack file, defaults to stdout")
+    args = parser.parse_args()
+
+    stacks = collapse_stacks(load_profiles(args.paths))
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for stack, microseconds in sorted(stacks.items()):
+            output.write(f"{stack} {microseconds}\n")
+    finally:
+        if args.output:
+            output.close()
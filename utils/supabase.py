@@ -1,12 +1,31 @@
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 import streamlit as st
 import os
+import time
+import atexit
+import threading
+from collections import defaultdict
 
-# Helper function for creating Supabase client
+# One client per process, created on first use. Its PostgREST session keeps HTTP connections alive,
+# so reusing it saves a TLS handshake per request. Forked worker processes build their own client
+# rather than sharing the parent's sockets.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+# Helper function for getting the Supabase client
 def get_supabase_client() -> Client:
-    url: str = get_secret("SUPABASE_URL")
-    key: str = get_secret("SUPABASE_KEY")
-    return create_client(url, key)
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                url: str = get_secret("SUPABASE_URL")
+                key: str = get_secret("SUPABASE_KEY")
+                _client = create_client(url, key)
+                _client_pid = os.getpid()
+    return _client
 
 # Helper function to get secret keys
 def get_secret(key: str) -> str:
@@ -20,13 +39,132 @@ def get_secret(key: str) -> str:
     return value
 
 # Fetch data from Supabase
-def fetch_cached_data_from_supabase(table):
+def fetch_cached_data_from_supabase(table, columns="*", filters=()):
+    return list(iter_table_rows(table, columns=columns, filters=filters))
+
+
+# Stream a table page by page with range queries instead of one response holding every row.
+# columns is the select projection, e.g. "ticker, analysis". filters are (column, operator, value)
+# tuples applied server side, e.g. ("created_at", "gte", "2024-10-01") or ("ticker", "in", tickers).
+def iter_table_rows(table, columns="*", filters=(), page_size=1000, order="ticker"):
     supabase: Client = get_supabase_client()
-    response = supabase.table(table).select("*").execute()
-    return response.data
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        for column, operator, value in filters:
+            # "in" is a keyword, the query builder calls it in_
+            query = getattr(query, "in_" if operator == "in" else operator)(column, value)
+        if order:
+            # a stable order keeps rows from shifting between pages
+            query = query.order(order)
+        rows = query.range(start, start + page_size - 1).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
 
 # Insert or update data
 def upsert_data_to_supabase(table, data):
     supabase: Client = get_supabase_client()
     response = supabase.table(table).upsert(data).execute()
     return response.data
+
+
+# Whether PostgREST rejected the data itself (a 4xx: invalid value, constraint violation, unknown column),
+# as opposed to a connection error or a 5xx, which fail every row alike. JSON errors carry the PostgreSQL
+# SQLSTATE or a PGRST code, others the HTTP status.
+def is_row_error(error):
+    if not isinstance(error, APIError):
+        return False
+    if isinstance(error.code, int):
+        return 400 <= error.code < 500
+    return str(error.code).startswith(("22", "23", "42", "PGRST1", "PGRST2"))
+
+
+# Accumulates rows per table and upserts them in batches instead of one request per row. Rows left in
+# the buffers are flushed by close(), which runs when used as a context manager and at interpreter exit.
+# on_written(table, rows) is called for every batch that made it into the database. With dry_run the
+# batches are counted as written without sending anything.
+class BufferedUpserter:
+    def __init__(self, batch_size=200, retries=3, backoff=2.0, on_written=None, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.on_written = on_written
+        self.retries = retries
+        self.backoff = backoff
+        self.buffers = defaultdict(list)
+        self.summary = defaultdict(lambda: {"rows": 0, "unchanged": 0, "failed": 0, "batches": 0, "seconds": 0.0})
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, table, row):
+        self.buffers[table].append(row)
+        if len(self.buffers[table]) >= self.batch_size:
+            self.flush(table)
+
+    # a row that did not need writing, only counted in the summary
+    def skip(self, table):
+        self.summary[table]["unchanged"] += 1
+
+    def flush(self, table=None):
+        for table in [table] if table else list(self.buffers):
+            rows, self.buffers[table] = self.buffers[table], []
+            if rows:
+                self.write_batch(table, rows, self.retries)
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.close)
+
+    def write_batch(self, table, rows, retries):
+        for attempt in range(retries + 1):
+            start_time = time.perf_counter()
+            try:
+                if not self.dry_run:
+                    upsert_data_to_supabase(table, rows)
+                self.record(table, rows=len(rows), seconds=time.perf_counter() - start_time)
+                if self.on_written:
+                    self.on_written(table, rows)
+                return
+            except Exception as e:
+                self.record(table, seconds=time.perf_counter() - start_time)
+                print(f"❌ Failed to upsert {len(rows)} rows to {table} (attempt {attempt + 1}/{retries + 1}): {e}")
+                # a rejected row fails the same way on every attempt
+                if is_row_error(e):
+                    break
+            if attempt < retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        else:
+            # the database is down or unreachable, splitting the batch would only multiply the failing
+            # requests; its rows stay unmarked so the next run retries them
+            print(f"❌ Giving up on {len(rows)} rows for {table}")
+            self.summary[table]["failed"] += len(rows)
+            return
+
+        # one bad row fails the whole batch, so split it to get the good rows through
+        if len(rows) > 1:
+            middle = len(rows) // 2
+            self.write_batch(table, rows[:middle], 0)
+            self.write_batch(table, rows[middle:], 0)
+        else:
+            print(f"❌ Giving up on {table} row for {rows[0].get('ticker', '?')}")
+            self.summary[table]["failed"] += 1
+
+    def record(self, table, rows=0, seconds=0.0):
+        self.summary[table]["batches"] += 1
+        self.summary[table]["rows"] += rows
+        self.summary[table]["seconds"] += seconds
+
+    def format_summary(self):
+        lines = ["Upsert summary:"]
+        for table, summary in sorted(self.summary.items()):
+            lines.append(
+                f"  {table}: {summary['rows']} rows written, {summary['unchanged']} unchanged, {summary['failed']} failed, "
+                f"{summary['batches']} requests, {summary['seconds']:.1f}s"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,190 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Offline stand-in for Yahoo: deterministic daily OHLCV histories per ticker, so the screener can be
+# benchmarked and regression-tested at universe scale without network. Prices are a random walk switching
+# between volatility regimes, with overnight gaps, missing trading days, and the apex patterns planted at
+# known places.
+
+BARS = 5000
+# (daily drift, daily volatility) of the calm, normal and stressed regimes
+REGIMES = ((0.0004, 0.01), (0.0002, 0.02), (-0.0005, 0.04))
+# chance per bar of switching to a (randomly picked) regime
+REGIME_SWITCH_RATE = 0.01
+# chance per bar of an overnight gap, sized at three times the daily volatility
+GAP_RATE = 0.02
+# share of business days left out, like exchange holidays
+HOLIDAY_RATE = 0.01
+
+# daily bars between planted patterns, 0 plants none
+PATTERN_SPACING = 400
+# each pattern follows a calm trend in its direction, so the SMA conditions of the apex indicators hold
+TREND_BARS = 150
+TREND_DRIFT = 0.002
+TREND_VOLATILITY = 0.005
+
+# Planted patterns as 2-day bars of (open, high, low, close), relative to the close before the pattern.
+# Kangaroo, wallaby inside it, a dip below the kangaroo to the 20 SMA and a bullish bar closing back in
+# its range.
+BULL_APPEAR_PATTERN = (
+    (1.00, 1.04, 0.98, 1.03),
+    (1.02, 1.03, 1.00, 1.01),
+    (1.00, 1.005, 0.955, 0.96),
+    (0.96, 1.01, 0.958, 1.005),
+)
+# Not the mirror image of bull appear, the evaluator wants the kangaroo below the 20 SMA, an outside bar
+# poking above the kangaroo and closing back in its range, and a falling 20 SMA afterwards.
+BEAR_APPEAR_PATTERN = (
+    (0.99, 1.00, 0.95, 0.96),
+    (0.97, 0.99, 0.96, 0.98),
+    (1.01, 1.045, 0.945, 0.955),
+    (0.955, 0.96, 0.93, 0.935),
+    (0.935, 0.94, 0.91, 0.915),
+    (0.915, 0.92, 0.89, 0.895),
+    (0.895, 0.90, 0.87, 0.875),
+)
+# A bear trap, a rally to a high, flush down bars breaking the trap and a bullish bar reclaiming it.
+BULL_RAGING_PATTERN = (
+    (1.00, 1.01, 0.98, 1.00),
+    (1.00, 1.01, 0.99, 1.00),
+    (1.00, 1.00, 0.95, 0.97),
+    (0.97, 1.01, 0.965, 1.00),
+    (1.00, 1.05, 0.995, 1.04),
+    (1.04, 1.10, 1.03, 1.08),
+    (1.08, 1.085, 1.045, 1.05),
+    (1.05, 1.055, 1.005, 1.01),
+    (1.01, 1.013, 0.97, 0.975),
+    (0.975, 0.978, 0.94, 0.945),
+    (0.945, 1.00, 0.944, 0.995),
+    (0.995, 1.01, 0.985, 1.00),
+)
+
+
+# bear patterns are the bull ones upside down
+def mirror_pattern(pattern):
+    return tuple((2 - open_, 2 - low, 2 - high, 2 - close) for open_, high, low, close in pattern)
+
+
+# pattern name -> (2-day bars, direction of the trend leading into it)
+PATTERNS = {
+    "bull_appear": (BULL_APPEAR_PATTERN, 1),
+    "bull_raging": (BULL_RAGING_PATTERN, 1),
+    "bear_appear": (BEAR_APPEAR_PATTERN, -1),
+    "bear_raging": (mirror_pattern(BULL_RAGING_PATTERN), -1),
+}
+
+
+def get_tickers(count):
+    return [f"SYN{i:05d}" for i in range(count)]
+
+
+# The same ticker, seed and end date always give the same history. The dates where patterns were
+# planted are kept in data.attrs["planted"] as {pattern name: [first date of the pattern, ...]}.
+def generate_prices(ticker, bars=BARS, end=None, seed=0, plant_patterns=True) -> pd.DataFrame:
+    rng = np.random.default_rng([zlib.crc32(ticker.encode()), seed])
+    index = get_trading_days(bars, end, rng)
+    n = len(index)
+
+    # regime per bar: a new regime is drawn at every switch and held until the next one
+    switches = rng.random(n) < REGIME_SWITCH_RATE
+    switches[0] = True
+    regime = rng.integers(len(REGIMES), size=n)[np.maximum.accumulate(np.where(switches, np.arange(n), 0))]
+    drift, volatility = np.array(REGIMES)[regime].T
+
+    planted = plan_patterns(index, rng) if plant_patterns and PATTERN_SPACING else []
+    for start, name in planted:
+        trend = slice(max(0, start - TREND_BARS), start)
+        drift[trend] = TREND_DRIFT * PATTERNS[name][1]
+        volatility[trend] = TREND_VOLATILITY
+
+    gaps = np.where(rng.random(n) < GAP_RATE, rng.normal(0, 3 * volatility), 0)
+    overnight = gaps + rng.normal(0, 0.2 * volatility)
+    intraday = drift + rng.normal(0, volatility)
+    start_price = np.exp(rng.uniform(np.log(20), np.log(300)))
+    close = start_price * np.exp(np.cumsum(overnight + intraday))
+    open_ = close * np.exp(-intraday)
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.5 * volatility)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.5 * volatility)))
+    prices = np.column_stack([open_, high, low, close])
+
+    # busy days trade more, and so do the planted patterns
+    volume = np.exp(rng.normal(np.log(rng.uniform(2e5, 5e6)), 0.4, n)) * (1 + np.abs(intraday) / volatility)
+    for start, name in planted:
+        bars_2d = np.array(PATTERNS[name][0])
+        end_pos = start + 2 * len(bars_2d)
+        pattern = split_2day_bars(bars_2d) * prices[start - 1, 3]
+        # carry on from where the pattern ends, shifting the rest of the walk
+        prices[end_pos:] *= pattern[-1, 3] / prices[end_pos - 1, 3]
+        prices[start:end_pos] = pattern
+        volume[start:end_pos] *= 2
+
+    data = pd.DataFrame(
+        {
+            "Open": prices[:, 0],
+            "High": prices[:, 1],
+            "Low": prices[:, 2],
+            "Close": prices[:, 3],
+            "Volume": volume.astype(np.int64),
+        },
+        index=pd.DatetimeIndex(index, name="Date"),
+    )
+    data[["Open", "High", "Low", "Close"]] = data[["Open", "High", "Low", "Close"]].round(2)
+    data.attrs["planted"] = {
+        name: [index[start] for start, planted_name in planted if planted_name == name] for name in PATTERNS
+    }
+    return data
+
+
+def get_trading_days(bars, end, rng):
+    end = np.datetime64(pd.Timestamp(end if end is not None else "today").normalize(), "D")
+    # numpy's business day calendar, pd.bdate_range builds its dates one by one in Python
+    start = np.busday_offset(end, -int(bars * (1 + 2 * HOLIDAY_RATE)), roll="backward")
+    days = np.arange(start, end + 1, dtype="datetime64[D]")
+    days = days[np.is_busday(days)]
+    return pd.DatetimeIndex(days[rng.random(len(days)) >= HOLIDAY_RATE][-bars:].astype("datetime64[ns]"))
+
+
+# Start positions of the planted patterns, about PATTERN_SPACING bars apart. The indicators aggregate bars
+# in pairs counted from the start of each year, so a pattern has to start on an even position within its
+# year and end in the same year to keep its 2-day bars intact.
+def plan_patterns(index, rng):
+    years = index.year.to_numpy()
+    year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    position_in_year = np.arange(len(index)) - np.repeat(year_starts, np.diff(np.r_[year_starts, len(index)]))
+
+    names = list(PATTERNS)
+    planted = []
+    start = max(PATTERN_SPACING, TREND_BARS + 1)
+    name = names[rng.integers(len(names))]
+    while start + 2 * len(PATTERNS[name][0]) <= len(index):
+        end = start + 2 * len(PATTERNS[name][0]) - 1
+        if position_in_year[start] % 2 == 0 and years[start] == years[end]:
+            planted.append((start, name))
+            start += PATTERN_SPACING
+            name = names[rng.integers(len(names))]
+        else:
+            start += 1
+    return planted
+
+
+# Two daily bars per 2-day bar, whose aggregation gives back exactly that bar
+def split_2day_bars(bars_2d):
+    open_, high, low, close = bars_2d.T
+    middle = (open_ + close) / 2
+    rising = close >= open_
+    # rising bars make their low on the first day and their high on the second, falling bars the reverse
+    first = np.column_stack([
+        open_,
+        np.where(rising, np.maximum(open_, middle), high),
+        np.where(rising, low, np.minimum(open_, middle)),
+        middle,
+    ])
+    second = np.column_stack([
+        middle,
+        np.where(rising, high, np.maximum(middle, close)),
+        np.where(rising, np.minimum(middle, close), low),
+        close,
+    ])
+    return np.stack([first, second], axis=1).reshape(-1, 4)
@@ -1,20 +1,244 @@
 import streamlit as st
 import pandas as pd
 import yfinance as yf
+import os
+import time
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from pytickersymbols import PyTickerSymbols
 import requests
 from get_all_tickers import get_tickers as gt
+import utils.price_store as ps
+import utils.synthetic_market as sm
+
+# Where prices come from:
+#   "yfinance"  - Yahoo, through the local price store (the default)
+#   "store"     - the local price store only, no network; tickers not in it come back as None
+#   "synthetic" - generated offline by utils.synthetic_market, for benchmarks and regression runs
+DATA_PROVIDER = os.getenv("DATA_PROVIDER", "yfinance")
+# size of the ticker universe under the synthetic provider
+SYNTHETIC_TICKER_COUNT = int(os.getenv("SYNTHETIC_TICKER_COUNT", "500"))
+
+
+def set_data_provider(name):
+    global DATA_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown data provider {name!r}, expected one of {', '.join(PROVIDERS)}")
+    DATA_PROVIDER = name
+
+
+def fetch_stored_stock_data(ticker):
+    data = ps.read_prices(ticker)
+    if data is not None:
+        ps.record_hit()
+    return data
+
+
+def fetch_synthetic_stock_data(ticker):
+    return sm.generate_prices(ticker)
+
+
+# provider name -> function returning the daily history of one ticker, None for the network-backed default
+PROVIDERS = {
+    "yfinance": None,
+    "store": fetch_stored_stock_data,
+    "synthetic": fetch_synthetic_stock_data,
+}
+
 
 # @st.cache_data(ttl="1d")
-def fetch_stock_data(ticker, period='max', interval='1d') -> pd.DataFrame:    
+def fetch_stock_data(ticker, period='max', interval='1d', use_store=True) -> pd.DataFrame:
+    if PROVIDERS[DATA_PROVIDER] is not None:
+        return PROVIDERS[DATA_PROVIDER](ticker)
+
+    # only full daily histories go through the local price store
+    if not (use_store and period == 'max' and interval == '1d'):
+        return download_stock_data(ticker, period=period, interval=interval)
+
+    stored = ps.read_prices(ticker)
+    if stored is not None and ps.is_fresh(ticker):
+        ps.record_hit()
+        return stored
+
+    # fetch only the bars after the stored history, plus a few overlapping ones to detect revisions
+    if stored is not None and len(stored) > ps.OVERLAP_BARS:
+        tail = download_stock_data(ticker, tail=True, start=stored.index[-ps.OVERLAP_BARS], interval=interval)
+        # a failed or empty download (network error, delisted ticker) says nothing about revisions, so
+        # keep the stored history rather than paying for a full refresh; the next run tries the tail again
+        if tail is None or tail.empty:
+            print(f"No new prices downloaded for {ticker}, using the stored history")
+            ps.record_tail_failure()
+            return stored
+        data = ps.merge_tail(stored, tail)
+        if data is not None:
+            ps.record_tail_fetch(len(tail))
+            store_stock_data(ticker, data)
+            return data
+        print(f"Stored history for {ticker} does not match the latest download, refreshing in full")
+        ps.record_full_refresh()
+
+    data = download_stock_data(ticker, period=period, interval=interval)
+    if data is not None and not data.empty:
+        store_stock_data(ticker, data)
+    return data
+
+
+# tail: only the bars after a stored history are downloaded, which the price store counts as a hit
+def download_stock_data(ticker, tail=False, **kwargs) -> pd.DataFrame:
+    start_time = time.perf_counter()
     try:
-        data = yf.download(ticker, period=period, interval=interval)
-        return data
+        data = yf.download(ticker, **kwargs)
     except Exception as e:
         print(f"Failed to fetch data for {ticker}")
         return None
-    
+    finally:
+        record_download(time.perf_counter() - start_time, tail)
+    return flatten_columns(data)
+
+
+def record_download(network_seconds, tail, count=1):
+    if tail:
+        ps.record_tail_download(network_seconds)
+    else:
+        ps.record_miss(network_seconds, count=count)
+
+
+def store_stock_data(ticker, data):
+    try:
+        ps.write_prices(ticker, data)
+    except Exception as e:
+        print(f"Failed to store prices for {ticker}: {e}")
+
+
+# yfinance returns (Price, Ticker) columns even for a single ticker, keep only the price level
+def flatten_columns(data):
+    if data is not None and isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+# Download many tickers with one yf.download call per chunk, running at most max_workers chunks
+# at a time. Yields (ticker, DataFrame) pairs as soon as their chunk arrives: None if the download failed
+# (retries used up, rate limited), an empty frame if Yahoo answered without rows for that ticker.
+def fetch_stock_data_batch(tickers, chunk_size=50, max_workers=4, retries=3, backoff=2.0, use_store=True):
+    # the offline providers have nothing to wait on, so no chunking or download threads
+    if PROVIDERS[DATA_PROVIDER] is not None:
+        for ticker in tickers:
+            yield ticker, PROVIDERS[DATA_PROVIDER](ticker)
+        return
+
+    fresh_tickers, tail_tickers, full_tickers = [], [], []
+    for ticker in tickers:
+        if use_store and ps.is_fresh(ticker):
+            fresh_tickers.append(ticker)
+        elif use_store and ps.last_updated(ticker) is not None:
+            tail_tickers.append(ticker)
+        else:
+            full_tickers.append(ticker)
+
+    jobs = iter(
+        [(chunk, True) for chunk in chunked(tail_tickers, chunk_size)]
+        + [(chunk, False) for chunk in chunked(full_tickers, chunk_size)]
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next(count):
+            return {
+                executor.submit(fetch_chunk, chunk, from_store, retries, backoff, use_store)
+                for chunk, from_store in itertools.islice(jobs, count)
+            }
+
+        pending = submit_next(max_workers)
+
+        # serve what is already on disk while the first chunks download
+        for ticker in fresh_tickers:
+            data = ps.read_prices(ticker)
+            if data is None:
+                data = fetch_stock_data(ticker, use_store=use_store)
+            else:
+                ps.record_hit()
+            yield ticker, data
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # only queue the next chunk once one has finished, so downloads never run ahead unbounded
+                pending |= submit_next(1)
+                yield from future.result()
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_chunk(tickers, from_store, retries, backoff, use_store):
+    stored = {ticker: ps.read_prices(ticker) for ticker in tickers} if from_store else {}
+    tail_starts = [d.index[-ps.OVERLAP_BARS] for d in stored.values() if d is not None and len(d) > ps.OVERLAP_BARS]
+    if tail_starts:
+        data = download_stock_data_chunk(tickers, retries, backoff, tail=True, start=min(tail_starts))
+    else:
+        data = download_stock_data_chunk(tickers, retries, backoff, period='max')
+
+    results = []
+    for ticker in tickers:
+        ticker_data = select_ticker(data, ticker)
+        # a failed chunk, or a ticker missing from it, says nothing about revisions: serve the stored
+        # history like fetch_stock_data does, rather than a full download per ticker of the chunk
+        if tail_starts and stored[ticker] is not None and (ticker_data is None or ticker_data.empty):
+            ps.record_tail_failure()
+            results.append((ticker, stored[ticker]))
+            continue
+        if tail_starts:
+            merged = ps.merge_tail(stored[ticker], ticker_data) if stored[ticker] is not None else None
+            if merged is not None:
+                ps.record_tail_fetch(len(ticker_data))
+                ticker_data = merged
+            else:
+                print(f"Stored history for {ticker} does not match the latest download, refreshing in full")
+                ps.record_full_refresh()
+                ticker_data = download_stock_data(ticker, period='max')
+
+        if use_store and ticker_data is not None and not ticker_data.empty:
+            store_stock_data(ticker, ticker_data)
+        results.append((ticker, ticker_data))
+    return results
+
+
+def download_stock_data_chunk(tickers, retries=3, backoff=2.0, tail=False, **kwargs):
+    # the tickers are counted once, with the network time of every attempt
+    network_seconds = 0.0
+    try:
+        for attempt in range(retries + 1):
+            start_time = time.perf_counter()
+            try:
+                data = yf.download(tickers, group_by='ticker', threads=False, progress=False, **kwargs)
+                if data is not None and not data.empty:
+                    return data
+            except Exception as e:
+                print(f"Failed to fetch data for {len(tickers)} tickers (attempt {attempt + 1}/{retries + 1}): {e}")
+            finally:
+                network_seconds += time.perf_counter() - start_time
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        return None
+    finally:
+        record_download(network_seconds, tail, count=len(tickers))
+
+
+# Pick one ticker out of a multi-ticker download, dropping the rows that only exist for other tickers.
+# None when the download failed, an empty frame when it has nothing for this ticker.
+def select_ticker(data, ticker):
+    if data is None:
+        return None
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker not in data.columns.get_level_values(0):
+            return pd.DataFrame()
+        data = data[ticker]
+    return data.dropna(how='all')
+
+
 # @st.cache_data(ttl="1d")
 # import requests
 
@@ -39,6 +263,9 @@ def fetch_next_earnings_date(ticker_symbol):
 
 
 def get_all_tickers():
+    if DATA_PROVIDER == "synthetic":
+        return sm.get_tickers(SYNTHETIC_TICKER_COUNT)
+
     # fetch from file sec_company_tickers.json
     url = "sec_company_tickers.json"
     data = pd.read_json(url)
@@ -51,6 +278,12 @@ def get_all_tickers():
     # print(tickers[:5])
     return tickers
     
+# Deterministic partition of the tickers, the same ticker always lands in the same shard on every
+# machine (unlike hash(), which is salted per process)
+def get_ticker_shard(tickers, shard_index=0, shard_count=1):
+    return [ticker for ticker in tickers if zlib.crc32(ticker.encode()) % shard_count == shard_index]
+
+
 # @st.cache_data(ttl="1d")
 def get_snp_500():
     stock_data = PyTickerSymbols()